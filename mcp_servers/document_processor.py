@@ -4,22 +4,66 @@ Handles secure document parsing and AI-powered content extraction
 """
 
 import os
+import io
+import re
 import json
 import logging
+import functools
+import mmap
+import zipfile
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
-from pathlib import Path
-from datetime import datetime
+from xml.etree import ElementTree
 
-import PyPDF2
-from docx import Document
 from anthropic import Anthropic
 import mcp
 from mcp.server.fastmcp import FastMCP
 
+# Run as a script (python mcp_servers/x.py), only mcp_servers/ is on sys.path
+try:
+    from mcp_servers.timestamps import now_iso
+except ImportError:
+    from timestamps import now_iso
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Files above this size are rejected before any parser opens them
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE_MB", "10")) * 1024 * 1024
+
+# Recent extraction results kept in memory, keyed by (extractor, path, mtime, size)
+EXTRACTION_CACHE_SIZE = 64
+_extraction_cache = OrderedDict()
+
+# Encodings tried in order for plain-text resumes
+TXT_ENCODINGS = ('utf-8', 'cp1252', 'latin-1')
+
+# Token budget for the resume text sent to Claude
+MAX_PROMPT_TOKENS = 12000
+
+# Inserted where the middle of an over-budget resume was cut
+TRUNCATION_MARKER = "\n...\n"
+
+# Trailing resume sections that rarely contain role data
+NOISE_SECTION_PATTERN = re.compile(
+    r"^[ \t]*(references|publications|patents)[ \t]*:?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Markdown code fence Claude sometimes wraps JSON responses in
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+# WordprocessingML namespace used in word/document.xml
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Run elements rendered as whitespace in paragraph text, as python-docx does
+RUN_BREAK_TEXT = {
+    f"{WORD_NAMESPACE}tab": "\t",
+    f"{WORD_NAMESPACE}br": "\n",
+    f"{WORD_NAMESPACE}cr": "\n",
+}
+
 # Initialize Anthropic client
 claude_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
@@ -51,52 +95,46 @@ async def extract_text_from_file(file_path: str, file_type: str) -> Dict[str, An
         "metadata": {
             "file_path": file_path,
             "file_type": file_type,
-            "extraction_timestamp": datetime.now().isoformat(),
+            "extraction_timestamp": now_iso(),
             "page_count": 0,
             "character_count": 0
         }
     }
     
     try:
-        file_path_obj = Path(file_path)
-        if not file_path_obj.exists():
-            result["error"] = f"File not found: {file_path}"
+        # Existence and size are checked by the extractor's own stat (_guarded_extraction)
+        extractor = FILE_TYPE_EXTRACTORS.get(file_type.lower())
+        if extractor is None:
+            result["error"] = f"Unsupported file type: {file_type}"
             return result
         
-        extracted_text = ""
-        
-        if file_type.lower() == 'pdf':
-            extracted_text, page_count = _extract_from_pdf(file_path)
+        if extractor is _extract_from_pdf:
+            extracted_text, page_count = extractor(file_path)
             result["metadata"]["page_count"] = page_count
-            
-        elif file_type.lower() in ['docx', 'doc']:
-            extracted_text = _extract_from_docx(file_path)
-            
-        elif file_type.lower() == 'txt':
-            extracted_text = _extract_from_txt(file_path)
-        
         else:
-            result["error"] = f"Unsupported file type: {file_type}"
-            return result
+            extracted_text = extractor(file_path)
         
         # Basic text validation
         if not extracted_text or len(extracted_text.strip()) < 10:
             result["error"] = "Insufficient text content extracted"
             return result
         
-        result.update({
-            "success": True,
-            "text": extracted_text,
-            "metadata": {
-                **result["metadata"],
-                "character_count": len(extracted_text),
-                "word_count": len(extracted_text.split()),
-                "lines_count": len(extracted_text.splitlines())
-            }
+        result["success"] = True
+        result["text"] = extracted_text
+        result["metadata"].update({
+            "character_count": len(extracted_text),
+            "word_count": len(extracted_text.split()),
+            "lines_count": len(extracted_text.splitlines())
         })
         
         logger.info(f"Successfully extracted {len(extracted_text)} characters from {file_path}")
         
+    except FileNotFoundError:
+        result["error"] = f"File not found: {file_path}"
+        
+    except FileTooLargeError as e:
+        result["error"] = str(e)
+        
     except Exception as e:
         result["error"] = f"Text extraction failed: {str(e)}"
         logger.error(f"Text extraction failed for {file_path}: {e}")
@@ -173,7 +211,7 @@ async def extract_professional_roles(text: str, document_id: str, client_name: s
             max_tokens=8000,
             messages=[{
                 "role": "user",
-                "content": extraction_prompt.format(text=text)
+                "content": extraction_prompt.format(text=_truncate_for_budget(text))
             }]
         )
         
@@ -183,10 +221,7 @@ async def extract_professional_roles(text: str, document_id: str, client_name: s
         # Try to extract JSON from the response
         try:
             # Remove any markdown formatting if present
-            if response_text.startswith('```json'):
-                response_text = response_text.replace('```json', '').replace('```', '').strip()
-            elif response_text.startswith('```'):
-                response_text = response_text.replace('```', '').strip()
+            response_text = _strip_code_fence(response_text)
             
             extracted_roles = json.loads(response_text)
             
@@ -204,18 +239,18 @@ async def extract_professional_roles(text: str, document_id: str, client_name: s
                 validated_role = {
                     "company": role.get("company", "").strip() if role.get("company") else "",
                     "title": role.get("title", "").strip() if role.get("title") else "",
-                    "start_year": role.get("start_year"),
-                    "end_year": role.get("end_year"),
-                    "start_month": role.get("start_month"),
-                    "end_month": role.get("end_month"),
+                    "start_year": _coerce_int(role.get("start_year")),
+                    "end_year": _coerce_int(role.get("end_year")),
+                    "start_month": _coerce_int(role.get("start_month")),
+                    "end_month": _coerce_int(role.get("end_month")),
                     "manager_title": role.get("manager_title"),
-                    "direct_reports": role.get("direct_reports", []),
+                    "direct_reports": _coerce_str_list(role.get("direct_reports")),
                     "budget_responsibility": role.get("budget_responsibility"),
                     "headcount": role.get("headcount"),
                     "quota": role.get("quota"),
-                    "peer_functions": role.get("peer_functions", []),
-                    "achievements": role.get("achievements", []),
-                    "responsibilities": role.get("responsibilities", []),
+                    "peer_functions": _coerce_str_list(role.get("peer_functions")),
+                    "achievements": _coerce_str_list(role.get("achievements")),
+                    "responsibilities": _coerce_str_list(role.get("responsibilities")),
                     "location": role.get("location"),
                     "employment_type": role.get("employment_type"),
                     "confidence_score": role.get("confidence_score", 0.7),
@@ -235,7 +270,7 @@ async def extract_professional_roles(text: str, document_id: str, client_name: s
                 "roles": validated_roles,
                 "extraction_metadata": {
                     "model": "claude-3-5-sonnet-20241022",
-                    "extraction_timestamp": datetime.now().isoformat(),
+                    "extraction_timestamp": now_iso(),
                     "total_roles_found": len(validated_roles),
                     "average_confidence": sum(r.get("confidence_score", 0) for r in validated_roles) / len(validated_roles) if validated_roles else 0,
                     "text_length": len(text),
@@ -305,88 +340,318 @@ async def enhance_role_data(role_data: Dict[str, Any], context_text: str) -> Dic
             }]
         )
         
-        enhanced_data = json.loads(response.content[0].text.strip())
+        enhanced_data = json.loads(_strip_code_fence(response.content[0].text))
         return {"success": True, "enhanced_role": enhanced_data}
         
     except Exception as e:
         logger.error(f"Role enhancement failed: {e}")
         return {"success": False, "error": str(e), "original_role": role_data}
 
-def _extract_from_pdf(file_path: str) -> tuple[str, int]:
-    """Extract text from PDF file using PyPDF2."""
-    text = ""
-    page_count = 0
+def _coerce_int(value: Any) -> Optional[int]:
+    """Normalize a year/month value from Claude ("2020", "2020.0", 2020.0, 2020) to int."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if value.isascii() and value.isdigit():
+            return int(value)
+        
+        # Numeric strings such as "2020.0" follow the float rules below
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    return None
+
+def _coerce_str_list(value: Any) -> List[str]:
+    """Normalize a list field from Claude to a list of non-empty strings."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    elif not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+
+def _strip_code_fence(text: str) -> str:
+    """Return the body of a ```json fenced block, or the stripped text if unfenced."""
+    match = CODE_FENCE_PATTERN.match(text)
+    return match.group(1) if match else text.strip()
+
+@functools.cache
+def _get_tokenizer():
+    """Load the tiktoken encoding once per process, or None if tiktoken is missing."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    
+    return tiktoken.get_encoding("cl100k_base")
+
+def _count_tokens(text: str) -> int:
+    """Count tokens with tiktoken as a proxy, or estimate ~4 characters per token."""
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return len(text) // 4
+    
+    return len(tokenizer.encode(text))
+
+def _truncate_for_budget(text: str, max_tokens: int = MAX_PROMPT_TOKENS) -> str:
+    """Trim resume text to fit the prompt token budget."""
+    original_tokens = _count_tokens(text)
+    if original_tokens <= max_tokens:
+        return text
+    
+    # Drop trailing reference/publication/patent sections first
+    match = NOISE_SECTION_PATTERN.search(text)
+    if match and match.start() > 0:
+        text = text[:match.start()].rstrip()
+    
+    token_count = _count_tokens(text)
+    if token_count > max_tokens:
+        # Keep the head (~2/3 of budget) and the tail (~1/3 of budget), leaving
+        # room for the marker; shrink until the estimate holds for this text
+        body = text
+        chars_per_token = len(body) / token_count
+        keep_tokens = max(0, max_tokens - _count_tokens(TRUNCATION_MARKER))
+        while True:
+            head_chars = int(keep_tokens * 2 / 3 * chars_per_token)
+            tail_chars = int(keep_tokens / 3 * chars_per_token)
+            text = body[:head_chars] + TRUNCATION_MARKER + body[len(body) - tail_chars:]
+            token_count = _count_tokens(text)
+            if token_count <= max_tokens or not head_chars + tail_chars:
+                break
+            chars_per_token *= min(0.9, max_tokens / token_count)
+    
+    logger.info(f"Truncated resume text from {original_tokens} to {token_count} tokens")
+    return text
+
+@functools.cache
+def _get_pdf_reader_class():
+    """Import PyPDF2 on first use so non-PDF workloads never pay for it."""
+    from PyPDF2 import PdfReader
+    return PdfReader
+
+@functools.cache
+def _get_pdfium():
+    """Import pypdfium2 once if installed; its C++ PDFium core extracts text far faster than PyPDF2."""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    
+    return pypdfium2
+
+@functools.cache
+def _get_etree():
+    """Import lxml on first use so non-DOCX workloads never pay for it; None if not installed."""
+    try:
+        from lxml import etree
+    except ImportError:
+        return None
     
+    return etree
+
+@functools.cache
+def _get_run_content_xpath():
+    """
+    Compile the XPath selecting a paragraph's run content once; evaluated in lxml's C core.
+    
+    Yields w:t text as strings and w:tab/w:br/w:cr as elements, in document order.
+    Only run children are selected, so tab stops declared in w:pPr are skipped.
+    """
+    return _get_etree().XPath(
+        ".//w:r/w:t/text() | .//w:r/w:tab | .//w:r/w:br | .//w:r/w:cr",
+        namespaces={"w": WORD_NAMESPACE[1:-1]},
+        smart_strings=False
+    )
+
+class FileTooLargeError(ValueError):
+    """Raised when a file exceeds MAX_FILE_SIZE."""
+
+def _guarded_extraction(func):
+    """
+    Stat the file once: reject it if larger than MAX_FILE_SIZE, and return the
+    cached result if the same extractor already parsed this unchanged file.
+    """
+    
+    @functools.wraps(func)
+    def wrapper(file_path: str, *args, **kwargs):
+        file_stat = os.stat(file_path)
+        if file_stat.st_size > MAX_FILE_SIZE:
+            raise FileTooLargeError(f"File too large: {file_stat.st_size} bytes (max: {MAX_FILE_SIZE})")
+        
+        # A rewritten file changes mtime or size, so stale entries are never hit
+        cache_key = (func.__name__, file_path, file_stat.st_mtime_ns, file_stat.st_size)
+        if cache_key in _extraction_cache:
+            _extraction_cache.move_to_end(cache_key)
+            return _extraction_cache[cache_key]
+        
+        extracted = func(file_path, *args, **kwargs)
+        _extraction_cache[cache_key] = extracted
+        if len(_extraction_cache) > EXTRACTION_CACHE_SIZE:
+            _extraction_cache.popitem(last=False)
+        return extracted
+    
+    return wrapper
+
+@_guarded_extraction
+def _extract_from_pdf(file_path: str) -> tuple[str, int]:
+    """Extract text from PDF file using pypdfium2 when installed, else PyPDF2."""
     try:
+        pdfium = _get_pdfium()
+        if pdfium is not None:
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                return _join_pdf_pages(_iter_pdfium_page_texts(pdf)), len(pdf)
+            finally:
+                pdf.close()
+        
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            page_count = len(pdf_reader.pages)
-            
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n--- Page {page_num + 1} ---\n"
-                        text += page_text + "\n"
-                except Exception as e:
-                    logger.warning(f"Failed to extract text from page {page_num + 1}: {e}")
-                    continue
+            pdf_reader = _get_pdf_reader_class()(file)
+            return _join_pdf_pages(_iter_pypdf2_page_texts(pdf_reader)), len(pdf_reader.pages)
     
     except Exception as e:
         logger.error(f"PDF extraction failed: {e}")
         raise
-    
-    return text.strip(), page_count
 
+def _iter_pdfium_page_texts(pdf):
+    """Yield each page's text from a pypdfium2 document (native PDFium extraction)."""
+    for page_num, page in enumerate(pdf):
+        try:
+            text_page = page.get_textpage()
+            try:
+                yield text_page.get_text_range().replace("\r\n", "\n")
+            finally:
+                text_page.close()
+        except Exception as e:
+            logger.warning(f"Failed to extract text from page {page_num + 1}: {e}")
+            yield ""
+        finally:
+            page.close()
+
+def _iter_pypdf2_page_texts(pdf_reader):
+    """Yield each page's text from a PyPDF2 reader."""
+    for page_num, page in enumerate(pdf_reader.pages):
+        try:
+            yield page.extract_text()
+        except Exception as e:
+            logger.warning(f"Failed to extract text from page {page_num + 1}: {e}")
+            yield ""
+
+def _join_pdf_pages(page_texts) -> str:
+    """Join non-empty page texts under '--- Page N ---' headers."""
+    text = io.StringIO()
+    for page_num, page_text in enumerate(page_texts, start=1):
+        if page_text:
+            # Write header and page text separately so each page is copied once
+            if text.tell():
+                text.write("\n\n")
+            text.write(f"--- Page {page_num} ---\n")
+            text.write(page_text)
+    return text.getvalue().strip()
+
+@_guarded_extraction
 def _extract_from_docx(file_path: str) -> str:
-    """Extract text from DOCX file using python-docx."""
-    text = ""
+    """Extract text from DOCX file by streaming word/document.xml with lxml, else xml.etree."""
+    paragraphs = []
     
     try:
-        doc = Document(file_path)
-        
-        # Extract text from paragraphs
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text += paragraph.text + "\n"
-        
-        # Extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():
-                        text += cell.text + " "
-                text += "\n"
+        with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as document_xml:
+            iter_paragraph_texts = _iter_lxml_paragraph_texts if _get_etree() is not None else _iter_etree_paragraph_texts
+            
+            # Paragraphs include table cell content, in document order
+            for paragraph_text in iter_paragraph_texts(document_xml):
+                if paragraph_text.strip():
+                    paragraphs.append(paragraph_text)
     
     except Exception as e:
         logger.error(f"DOCX extraction failed: {e}")
         raise
     
-    return text.strip()
+    return "\n".join(paragraphs).strip()
+
+def _iter_lxml_paragraph_texts(document_xml):
+    """Yield each w:p paragraph's text using lxml's tag-filtered iterparse."""
+    for _, paragraph in _get_etree().iterparse(document_xml, events=("end",), tag=f"{WORD_NAMESPACE}p"):
+        yield "".join(
+            node if isinstance(node, str) else RUN_BREAK_TEXT[node.tag]
+            for node in _get_run_content_xpath()(paragraph)
+        )
+        
+        # Free the parsed paragraph and detach already-processed siblings
+        # so the partial tree stays flat on large files
+        paragraph.clear()
+        while paragraph.getprevious() is not None:
+            del paragraph.getparent()[0]
+
+def _iter_etree_paragraph_texts(document_xml):
+    """Yield each w:p paragraph's text using the stdlib's C-accelerated ElementTree."""
+    paragraph_tag = f"{WORD_NAMESPACE}p"
+    run_tag = f"{WORD_NAMESPACE}r"
+    text_tag = f"{WORD_NAMESPACE}t"
+    
+    # ElementTree has no getparent(), so track open ancestors to detach finished elements
+    ancestors = []
+    for event, element in ElementTree.iterparse(document_xml, events=("start", "end")):
+        if event == "start":
+            ancestors.append(element)
+            continue
+        
+        ancestors.pop()
+        if element.tag == paragraph_tag:
+            yield "".join(
+                (child.text or "") if child.tag == text_tag else RUN_BREAK_TEXT.get(child.tag, "")
+                for run in element.iter(run_tag)
+                for child in run
+            )
+        
+        # Drop finished paragraphs and top-level body blocks (document > body > block)
+        # so the tree stays flat on large files
+        if element.tag == paragraph_tag or len(ancestors) == 2:
+            element.clear()
+            if ancestors:
+                ancestors[-1].remove(element)
 
+@_guarded_extraction
 def _extract_from_txt(file_path: str) -> str:
-    """Extract text from TXT file."""
+    """Extract text from TXT file, decoding straight from a read-only memory map."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
-        
-        # Try different encodings if UTF-8 fails
-        if not text.strip():
-            encodings = ['latin-1', 'cp1252', 'iso-8859-1']
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as file:
-                        text = file.read()
-                        if text.strip():
-                            break
-                except:
-                    continue
+        with open(file_path, 'rb') as file:
+            # mmap rejects empty files; there is nothing to decode anyway
+            if not os.fstat(file.fileno()).st_size:
+                return ""
+            
+            # Decoding from the mapping avoids an intermediate bytes copy of the file
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _decode_txt(data).strip()
     
     except Exception as e:
         logger.error(f"TXT extraction failed: {e}")
         raise
+
+def _decode_txt(data) -> str:
+    """Decode TXT bytes, falling back to Windows/Latin-1 when they are not valid UTF-8."""
+    for encoding in TXT_ENCODINGS[:-1]:
+        try:
+            return str(data, encoding)
+        except UnicodeDecodeError:
+            continue
     
-    return text.strip()
+    # latin-1 maps every byte, so decoding always succeeds
+    return str(data, TXT_ENCODINGS[-1])
+
+# Extractor for each supported file type; the PDF extractor also returns a page count
+FILE_TYPE_EXTRACTORS = {
+    'pdf': _extract_from_pdf,
+    'docx': _extract_from_docx,
+    'doc': _extract_from_docx,
+    'txt': _extract_from_txt,
+}
 
 if __name__ == "__main__":
     logger.info("Starting Document Processor MCP Server...")
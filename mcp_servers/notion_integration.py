@@ -4,27 +4,154 @@ Handles professional history database operations in Notion
 """
 
 import os
+import copy
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
-from datetime import datetime
-import json
+from contextlib import aclosing
+from dataclasses import asdict, dataclass
+from functools import cache, lru_cache
+from typing import AsyncIterator, Dict, List, Any, Optional
+import time
 
-from notion_client import Client
-from fuzzywuzzy import fuzz
+import httpx
+import numpy as np
+from notion_client import AsyncClient
+from rapidfuzz import fuzz, process, utils
 import mcp
 from mcp.server.fastmcp import FastMCP
 
+# Run as a script (python mcp_servers/x.py), only mcp_servers/ is on sys.path
+try:
+    from mcp_servers.timestamps import now_iso
+except ImportError:
+    from timestamps import now_iso
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Notion client
-notion = Client(auth=os.getenv("NOTION_TOKEN"))
+# Initialize Notion client on a long-lived keep-alive pool so tool calls
+# reuse warm connections to api.notion.com instead of re-handshaking
+notion = AsyncClient(
+    auth=os.getenv("NOTION_TOKEN"),
+    client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+    )
+)
 DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
 
+# Notion caps database query results at 100 per request
+NOTION_PAGE_SIZE = 100
+
+# Concurrent requests allowed against Notion's ~3 requests/second rate limit
+NOTION_MAX_CONCURRENT_REQUESTS = 3
+
+# Optional role fields written to Notion as (role key, Notion property) pairs
+NUMBER_PROPERTY_FIELDS = (
+    ("start_year", "Start Year"),
+    ("end_year", "End Year"),
+    ("start_month", "Start Month"),
+    ("end_month", "End Month"),
+    ("budget_responsibility", "Budget Responsibility"),
+    ("headcount", "Headcount"),
+    ("quota", "Quota"),
+)
+TEXT_PROPERTY_FIELDS = (
+    ("manager_title", "Manager Title"),
+    ("location", "Location"),
+)
+
+# The optional fields above bound to their property value builders at import:
+# (role key, Notion property, builder), in the order properties are written
+OPTIONAL_PROPERTY_WRITERS = (
+    *((role_key, notion_key, lambda value: {"number": value})
+      for role_key, notion_key in NUMBER_PROPERTY_FIELDS),
+    *((role_key, notion_key, lambda value: {"rich_text": [{"text": {"content": value}}]})
+      for role_key, notion_key in TEXT_PROPERTY_FIELDS),
+    ("employment_type", "Employment Type", lambda value: {"select": {"name": value}}),
+)
+
+# Role fields read from a Notion page: (role key, Notion property, value kind)
+PAGE_PROPERTY_FIELDS = (
+    ("company", "Company", "text"),
+    ("title", "Title", "text"),
+    ("start_year", "Start Year", "number"),
+    ("end_year", "End Year", "number"),
+    ("start_month", "Start Month", "number"),
+    ("end_month", "End Month", "number"),
+    ("manager_title", "Manager Title", "text"),
+    ("budget_responsibility", "Budget Responsibility", "number"),
+    ("headcount", "Headcount", "number"),
+    ("quota", "Quota", "number"),
+    ("location", "Location", "text"),
+    ("employment_type", "Employment Type", "select"),
+    ("client", "Client", "text"),
+)
+
+# Per value kind: default and a reader for each Notion property type it accepts
+PROPERTY_READERS = {
+    "text": ("", {
+        "title": lambda prop: prop["title"][0]["text"]["content"] if prop["title"] else "",
+        "rich_text": lambda prop: prop["rich_text"][0]["text"]["content"] if prop["rich_text"] else "",
+    }),
+    "number": (None, {
+        "number": lambda prop: prop["number"],
+    }),
+    "select": ("", {
+        "select": lambda prop: prop["select"]["name"] if prop["select"] else "",
+    }),
+}
+
+# PAGE_PROPERTY_FIELDS resolved against PROPERTY_READERS once at import:
+# (role key, Notion property, default, readers by property type)
+PAGE_FIELD_SPECS = tuple(
+    (role_key, property_name, *PROPERTY_READERS[kind])
+    for role_key, property_name, kind in PAGE_PROPERTY_FIELDS
+)
+
+# Notion accepts at most 100 child blocks per append request
+NOTION_MAX_BLOCKS_PER_APPEND = 100
+
+# Role fields compared by _generate_role_diff, in the order they appear in a diff
+DIFF_SCALAR_FIELDS = (
+    "title", "start_year", "end_year", "start_month", "end_month",
+    "manager_title", "budget_responsibility", "headcount", "quota",
+    "location", "employment_type"
+)
+DIFF_LIST_FIELDS = ("achievements", "responsibilities", "direct_reports", "peer_functions")
+
+# Seconds a retrieved database schema is reused before asking Notion again
+SCHEMA_CACHE_TTL = 300
+_schema_cache = {"timestamp": 0.0, "result": None}
+
 # Fuzzy matching threshold for role matching
 FUZZY_MATCH_THRESHOLD = 80
 
+# Lowest company/title score that can still reach the threshold when the other
+# field and the date score are perfect (weights 0.4 / 0.4 / 0.2)
+MIN_FIELD_MATCH_SCORE = max(0.0, (FUZZY_MATCH_THRESHOLD - 100 * 0.4 - 100 * 0.2) / 0.4)
+
+@dataclass(slots=True)
+class Role:
+    """A role parsed from a Notion database page."""
+    notion_id: str
+    url: str
+    created_time: str
+    last_edited_time: str
+    company: str
+    title: str
+    start_year: Optional[int]
+    end_year: Optional[int]
+    start_month: Optional[int]
+    end_month: Optional[int]
+    manager_title: str
+    budget_responsibility: Optional[int]
+    headcount: Optional[int]
+    quota: Optional[int]
+    location: str
+    employment_type: str
+    client: str
+
 # Initialize FastMCP server
 mcp = FastMCP(
     "NotionIntegration",
@@ -33,6 +160,71 @@ mcp = FastMCP(
     port=8003,
 )
 
+async def iter_existing_role_pages(
+    client_name: str,
+    limit: Optional[int] = None
+) -> AsyncIterator[tuple[List[Role], Dict[str, Any]]]:
+    """
+    Stream a client's roles from the Notion database, one result page at a time.
+    
+    Args:
+        client_name (str): Name of the client to query roles for
+        limit (Optional[int]): Request at most this many database rows in total
+    
+    Yields:
+        (parsed roles, raw query response) per page, in database order
+    """
+    
+    query_args = {
+        "database_id": DATABASE_ID,
+        "filter": {"property": "Client", "title": {"equals": client_name}}
+    }
+    
+    requested = 0
+    
+    def request_page(start_cursor: Optional[str] = None) -> asyncio.Task:
+        nonlocal requested
+        # Size the last page to the limit so next_cursor resumes right after it
+        page_size = NOTION_PAGE_SIZE if limit is None else min(NOTION_PAGE_SIZE, limit - requested)
+        requested += page_size
+        page_args = dict(query_args, page_size=page_size)
+        if start_cursor:
+            page_args["start_cursor"] = start_cursor
+        return asyncio.create_task(notion.databases.query(**page_args))
+    
+    next_page = request_page()
+    try:
+        while next_page is not None:
+            response = await next_page
+            next_page = None
+            
+            # Cursors are serial, so fetch the next page while this one is consumed
+            if response.get("has_more") and (limit is None or requested < limit):
+                next_page = request_page(response["next_cursor"])
+            
+            roles = [role for role in map(_parse_notion_page_to_role, response["results"]) if role]
+            yield roles, response
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+
+async def iter_existing_roles(client_name: str, limit: Optional[int] = None) -> AsyncIterator[Role]:
+    """
+    Stream a client's roles from the Notion database.
+    
+    Args:
+        client_name (str): Name of the client to query roles for
+        limit (Optional[int]): Request at most this many database rows in total
+    
+    Yields:
+        Parsed roles in database order
+    """
+    
+    async with aclosing(iter_existing_role_pages(client_name, limit=limit)) as pages:
+        async for roles, _ in pages:
+            for role in roles:
+                yield role
+
 @mcp.tool()
 async def query_existing_roles(client_name: str, limit: int = 100) -> Dict[str, Any]:
     """
@@ -52,27 +244,17 @@ async def query_existing_roles(client_name: str, limit: int = 100) -> Dict[str,
         "total_count": 0,
         "client_name": client_name,
         "error": "",
-        "query_timestamp": datetime.now().isoformat()
+        "query_timestamp": now_iso()
     }
     
     try:
-        # Query the Notion database
-        query_filter = {
-            "property": "Client",
-            "title": {"equals": client_name}
-        }
-        
-        response = notion.databases.query(
-            database_id=DATABASE_ID,
-            filter=query_filter,
-            page_size=limit
-        )
-        
         roles = []
-        for page in response["results"]:
-            role = _parse_notion_page_to_role(page)
-            if role:
-                roles.append(role)
+        response = {}
+        
+        # Pages stop exactly at the limit, so the last response's cursor resumes after it
+        async with aclosing(iter_existing_role_pages(client_name, limit=limit)) as pages:
+            async for page_roles, response in pages:
+                roles.extend(asdict(role) for role in page_roles)
         
         result.update({
             "success": True,
@@ -82,11 +264,11 @@ async def query_existing_roles(client_name: str, limit: int = 100) -> Dict[str,
             "next_cursor": response.get("next_cursor")
         })
         
-        logger.info(f"Successfully queried {len(roles)} roles for client: {client_name}")
+        logger.info("Successfully queried %d roles for client: %s", len(roles), client_name)
         
     except Exception as e:
         result["error"] = f"Query failed: {str(e)}"
-        logger.error(f"Failed to query roles for {client_name}: {e}")
+        logger.error("Failed to query roles for %s: %s", client_name, e)
     
     return result
 
@@ -115,7 +297,7 @@ async def create_or_update_role(
         "page_id": "",
         "action": "",
         "error": "",
-        "operation_timestamp": datetime.now().isoformat()
+        "operation_timestamp": now_iso()
     }
     
     try:
@@ -124,21 +306,21 @@ async def create_or_update_role(
         
         if existing_role_id:
             # Update existing page
-            response = notion.pages.update(
+            response = await notion.pages.update(
                 page_id=existing_role_id,
                 properties=notion_properties
             )
             result["action"] = "updated"
-            logger.info(f"Updated existing role: {existing_role_id}")
+            logger.info("Updated existing role: %s", existing_role_id)
             
         else:
             # Create new page
-            response = notion.pages.create(
+            response = await notion.pages.create(
                 parent={"database_id": DATABASE_ID},
                 properties=notion_properties
             )
             result["action"] = "created"
-            logger.info(f"Created new role for {client_name}")
+            logger.info("Created new role for %s", client_name)
         
         page_id = response["id"]
         
@@ -154,10 +336,64 @@ async def create_or_update_role(
         
     except Exception as e:
         result["error"] = f"Create/update operation failed: {str(e)}"
-        logger.error(f"Failed to create/update role for {client_name}: {e}")
+        logger.error("Failed to create/update role for %s: %s", client_name, e)
     
     return result
 
+@mcp.tool()
+async def create_or_update_roles_batch(
+    items: List[Dict[str, Any]],
+    client_name: str
+) -> Dict[str, Any]:
+    """
+    Create or update several roles in Notion concurrently.
+    
+    Args:
+        items (List): Roles to save, each a dict with "role_data" and optional
+            "citations" and "existing_role_id" keys
+        client_name (str): Name of the client
+    
+    Returns:
+        Dict containing per-role operation results and counts
+    """
+    
+    semaphore = asyncio.Semaphore(NOTION_MAX_CONCURRENT_REQUESTS)
+    
+    async def save_role(item: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await create_or_update_role(
+                    role_data=item.get("role_data", {}),
+                    citations=item.get("citations", []),
+                    client_name=client_name,
+                    existing_role_id=item.get("existing_role_id")
+                )
+            except Exception as e:
+                # One bad role must not cancel or hide the rest of the batch
+                logger.error("Failed to create/update role for %s: %s", client_name, e)
+                return {
+                    "success": False,
+                    "page_id": "",
+                    "action": "",
+                    "error": f"Create/update operation failed: {str(e)}",
+                    "operation_timestamp": now_iso()
+                }
+    
+    # gather returns results in input order, whatever order the saves finish in
+    results = await asyncio.gather(*(save_role(item) for item in items))
+    
+    failed_count = sum(1 for r in results if not r["success"])
+    logger.info("Batch save complete for %s: %d saved, %d failed", client_name, len(results) - failed_count, failed_count)
+    
+    return {
+        "success": failed_count == 0,
+        "results": results,
+        "created_count": sum(1 for r in results if r["success"] and r["action"] == "created"),
+        "updated_count": sum(1 for r in results if r["success"] and r["action"] == "updated"),
+        "failed_count": failed_count,
+        "operation_timestamp": now_iso()
+    }
+
 @mcp.tool()
 async def find_role_matches(
     extracted_roles: List[Dict[str, Any]], 
@@ -186,16 +422,21 @@ async def find_role_matches(
     }
     
     try:
-        for extracted_role in extracted_roles:
-            best_match = None
-            best_score = 0
+        # Unchanged roles (common when a resume is reprocessed) resolve with a hash lookup
+        best_matches = _find_exact_role_matches(extracted_roles, existing_roles)
+        
+        fuzzy_rows = [i for i in range(len(extracted_roles)) if i not in best_matches]
+        if fuzzy_rows and existing_roles:
+            best_indices, best_scores = _find_best_fuzzy_matches(
+                [extracted_roles[i] for i in fuzzy_rows], existing_roles
+            )
             
-            for existing_role in existing_roles:
-                match_score = _calculate_role_match_score(extracted_role, existing_role)
-                
-                if match_score > best_score and match_score >= FUZZY_MATCH_THRESHOLD:
-                    best_score = match_score
-                    best_match = existing_role
+            for i, best_index, best_score in zip(fuzzy_rows, best_indices, best_scores):
+                if best_score >= FUZZY_MATCH_THRESHOLD:
+                    best_matches[i] = (existing_roles[best_index], int(best_score))
+        
+        for i, extracted_role in enumerate(extracted_roles):
+            best_match, best_score = best_matches.get(i, (None, 0))
             
             if best_match:
                 # Found a match
@@ -213,10 +454,13 @@ async def find_role_matches(
                 result["new_roles"].append(extracted_role)
                 result["match_summary"]["new_count"] += 1
         
-        logger.info(f"Role matching complete: {result['match_summary']['matched_count']} matches, {result['match_summary']['new_count']} new roles")
+        logger.info(
+            "Role matching complete: %d matches, %d new roles",
+            result["match_summary"]["matched_count"], result["match_summary"]["new_count"]
+        )
         
     except Exception as e:
-        logger.error(f"Role matching failed: {e}")
+        logger.error("Role matching failed: %s", e)
         result["error"] = str(e)
     
     return result
@@ -238,39 +482,28 @@ async def delete_role(page_id: str, reason: str = "User requested deletion") ->
         "success": False,
         "page_id": page_id,
         "error": "",
-        "deletion_timestamp": datetime.now().isoformat()
+        "deletion_timestamp": now_iso()
     }
     
     try:
         # Archive the page (Notion doesn't support true deletion via API)
-        notion.pages.update(
+        await notion.pages.update(
             page_id=page_id,
             archived=True
         )
         
         # Add deletion reason to the page
-        notion.blocks.children.append(
+        await notion.blocks.children.append(
             block_id=page_id,
-            children=[{
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [{
-                        "type": "text",
-                        "text": {
-                            "content": f"ARCHIVED: {reason} (Timestamp: {datetime.now().isoformat()})"
-                        }
-                    }]
-                }
-            }]
+            children=[_paragraph_block(f"ARCHIVED: {reason} (Timestamp: {now_iso()})")]
         )
         
         result["success"] = True
-        logger.info(f"Successfully archived role: {page_id}")
+        logger.info("Successfully archived role: %s", page_id)
         
     except Exception as e:
         result["error"] = f"Deletion failed: {str(e)}"
-        logger.error(f"Failed to delete role {page_id}: {e}")
+        logger.error("Failed to delete role %s: %s", page_id, e)
     
     return result
 
@@ -283,8 +516,12 @@ async def get_database_schema() -> Dict[str, Any]:
         Dict containing database schema information
     """
     
+    # Serve a recently retrieved schema from memory; callers get their own copy to mutate
+    if _schema_cache["result"] and time.monotonic() - _schema_cache["timestamp"] < SCHEMA_CACHE_TTL:
+        return copy.deepcopy(_schema_cache["result"])
+    
     try:
-        database = notion.databases.retrieve(database_id=DATABASE_ID)
+        database = await notion.databases.retrieve(database_id=DATABASE_ID)
         
         schema = {
             "database_id": DATABASE_ID,
@@ -305,44 +542,50 @@ async def get_database_schema() -> Dict[str, Any]:
                     option["name"] for option in prop_config.get("select", {}).get("options", [])
                 ]
         
-        return {"success": True, "schema": schema}
+        result = {"success": True, "schema": schema}
+        _schema_cache.update(timestamp=time.monotonic(), result=result)
+        return copy.deepcopy(result)
         
     except Exception as e:
-        logger.error(f"Failed to retrieve database schema: {e}")
+        logger.error("Failed to retrieve database schema: %s", e)
         return {"success": False, "error": str(e)}
 
-def _parse_notion_page_to_role(page: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """Parse a Notion page into a standardized role dictionary."""
+@mcp.tool()
+async def invalidate_schema_cache() -> Dict[str, Any]:
+    """
+    Discard the cached database schema, e.g. after renaming Notion columns.
+    
+    Returns:
+        Dict confirming the cache was cleared
+    """
+    
+    _schema_cache.update(timestamp=0.0, result=None)
+    logger.info("Database schema cache invalidated")
+    return {"success": True}
+
+def _parse_notion_page_to_role(page: Dict[str, Any]) -> Optional[Role]:
+    """Parse a Notion page into a Role."""
     
     try:
         properties = page["properties"]
         
-        role = {
-            "notion_id": page["id"],
-            "url": page["url"],
-            "created_time": page["created_time"],
-            "last_edited_time": page["last_edited_time"],
-            
-            # Extract property values
-            "company": _extract_text_property(properties.get("Company")),
-            "title": _extract_text_property(properties.get("Title")),
-            "start_year": _extract_number_property(properties.get("Start Year")),
-            "end_year": _extract_number_property(properties.get("End Year")),
-            "start_month": _extract_number_property(properties.get("Start Month")),
-            "end_month": _extract_number_property(properties.get("End Month")),
-            "manager_title": _extract_text_property(properties.get("Manager Title")),
-            "budget_responsibility": _extract_number_property(properties.get("Budget Responsibility")),
-            "headcount": _extract_number_property(properties.get("Headcount")),
-            "quota": _extract_number_property(properties.get("Quota")),
-            "location": _extract_text_property(properties.get("Location")),
-            "employment_type": _extract_select_property(properties.get("Employment Type")),
-            "client": _extract_text_property(properties.get("Client")),
-        }
+        fields = {}
+        # Extract property values, dispatching on each property's type
+        for role_key, property_name, default, readers in PAGE_FIELD_SPECS:
+            prop = properties.get(property_name)
+            reader = readers.get(prop["type"]) if prop else None
+            fields[role_key] = reader(prop) if reader else default
         
-        return role
+        return Role(
+            notion_id=page["id"],
+            url=page["url"],
+            created_time=page["created_time"],
+            last_edited_time=page["last_edited_time"],
+            **fields
+        )
         
     except Exception as e:
-        logger.warning(f"Failed to parse Notion page {page.get('id', 'unknown')}: {e}")
+        logger.warning("Failed to parse Notion page %s: %s", page.get("id", "unknown"), e)
         return None
 
 def _prepare_notion_properties(role_data: Dict[str, Any], client_name: str) -> Dict[str, Any]:
@@ -354,31 +597,11 @@ def _prepare_notion_properties(role_data: Dict[str, Any], client_name: str) -> D
         "Title": {"rich_text": [{"text": {"content": role_data.get("title", "")}}]},
     }
     
-    # Add numeric properties
-    if role_data.get("start_year"):
-        properties["Start Year"] = {"number": role_data["start_year"]}
-    if role_data.get("end_year"):
-        properties["End Year"] = {"number": role_data["end_year"]}
-    if role_data.get("start_month"):
-        properties["Start Month"] = {"number": role_data["start_month"]}
-    if role_data.get("end_month"):
-        properties["End Month"] = {"number": role_data["end_month"]}
-    if role_data.get("budget_responsibility"):
-        properties["Budget Responsibility"] = {"number": role_data["budget_responsibility"]}
-    if role_data.get("headcount"):
-        properties["Headcount"] = {"number": role_data["headcount"]}
-    if role_data.get("quota"):
-        properties["Quota"] = {"number": role_data["quota"]}
-    
-    # Add text properties
-    if role_data.get("manager_title"):
-        properties["Manager Title"] = {"rich_text": [{"text": {"content": role_data["manager_title"]}}]}
-    if role_data.get("location"):
-        properties["Location"] = {"rich_text": [{"text": {"content": role_data["location"]}}]}
-    
-    # Add select property
-    if role_data.get("employment_type"):
-        properties["Employment Type"] = {"select": {"name": role_data["employment_type"]}}
+    # Add the optional properties the role carries, in one pass
+    for role_key, notion_key, build_value in OPTIONAL_PROPERTY_WRITERS:
+        value = role_data.get(role_key)
+        if value:
+            properties[notion_key] = build_value(value)
     
     return properties
 
@@ -390,50 +613,16 @@ async def _add_citations_to_page(page_id: str, citations: List[Dict[str, Any]],
         
         # Add role details section
         if role_data.get("achievements"):
-            blocks.append({
-                "object": "block",
-                "type": "heading_2",
-                "heading_2": {
-                    "rich_text": [{"type": "text", "text": {"content": "Key Achievements"}}]
-                }
-            })
-            
-            for achievement in role_data["achievements"]:
-                blocks.append({
-                    "object": "block",
-                    "type": "bulleted_list_item",
-                    "bulleted_list_item": {
-                        "rich_text": [{"type": "text", "text": {"content": achievement}}]
-                    }
-                })
+            blocks.append(_heading_block("Key Achievements"))
+            blocks.extend(_bulleted_block(achievement) for achievement in role_data["achievements"])
         
         if role_data.get("responsibilities"):
-            blocks.append({
-                "object": "block",
-                "type": "heading_2",
-                "heading_2": {
-                    "rich_text": [{"type": "text", "text": {"content": "Key Responsibilities"}}]
-                }
-            })
-            
-            for responsibility in role_data["responsibilities"]:
-                blocks.append({
-                    "object": "block",
-                    "type": "bulleted_list_item",
-                    "bulleted_list_item": {
-                        "rich_text": [{"type": "text", "text": {"content": responsibility}}]
-                    }
-                })
+            blocks.append(_heading_block("Key Responsibilities"))
+            blocks.extend(_bulleted_block(responsibility) for responsibility in role_data["responsibilities"])
         
         # Add citations section
         if citations:
-            blocks.append({
-                "object": "block",
-                "type": "heading_2",
-                "heading_2": {
-                    "rich_text": [{"type": "text", "text": {"content": "Source Citations"}}]
-                }
-            })
+            blocks.append(_heading_block("Source Citations"))
             
             for citation in citations:
                 citation_text = f"Document: {citation.get('document_id', 'Unknown')}"
@@ -442,62 +631,161 @@ async def _add_citations_to_page(page_id: str, citations: List[Dict[str, Any]],
                 if citation.get('confidence_score'):
                     citation_text += f", Confidence: {citation['confidence_score']:.2f}"
                 
-                blocks.append({
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [{"type": "text", "text": {"content": citation_text}}]
-                    }
-                })
+                blocks.append(_paragraph_block(citation_text))
         
-        # Add blocks to the page
-        if blocks:
-            notion.blocks.children.append(block_id=page_id, children=blocks)
+        # Add blocks to the page in request-sized chunks; appends to the same
+        # page must stay sequential to preserve block order
+        for i in range(0, len(blocks), NOTION_MAX_BLOCKS_PER_APPEND):
+            await notion.blocks.children.append(
+                block_id=page_id,
+                children=blocks[i:i + NOTION_MAX_BLOCKS_PER_APPEND]
+            )
             
     except Exception as e:
-        logger.error(f"Failed to add citations to page {page_id}: {e}")
+        logger.error("Failed to add citations to page %s: %s", page_id, e)
+
+def _rich_text(content: str) -> List[Dict[str, Any]]:
+    """Build a single-span Notion rich text array."""
+    return [{"type": "text", "text": {"content": content}}]
+
+@cache
+def _heading_block(content: str) -> Dict[str, Any]:
+    """Build a Notion heading_2 block (section headings are constant, so built once and shared)."""
+    return {"object": "block", "type": "heading_2", "heading_2": {"rich_text": _rich_text(content)}}
+
+def _bulleted_block(content: str) -> Dict[str, Any]:
+    """Build a Notion bulleted_list_item block."""
+    return {"object": "block", "type": "bulleted_list_item", "bulleted_list_item": {"rich_text": _rich_text(content)}}
 
-def _calculate_role_match_score(role1: Dict[str, Any], role2: Dict[str, Any]) -> int:
-    """Calculate similarity score between two roles."""
+def _paragraph_block(content: str) -> Dict[str, Any]:
+    """Build a Notion paragraph block."""
+    return {"object": "block", "type": "paragraph", "paragraph": {"rich_text": _rich_text(content)}}
+
+def _find_exact_role_matches(
+    extracted_roles: List[Dict[str, Any]],
+    existing_roles: List[Dict[str, Any]]
+) -> Dict[int, tuple]:
+    """
+    Match extracted roles whose normalized company and title equal an existing role's.
     
-    company_score = fuzz.ratio(
-        role1.get("company", "").lower(),
-        role2.get("company", "").lower()
+    Only matches no fuzzy candidate could outscore are returned: same start year
+    (score 100), or no extracted start year (no candidate earns a date score).
+    Returns {extracted index: (existing role, match score)}.
+    """
+    
+    exact_index = {}
+    for existing_role in existing_roles:
+        key = (_normalize_text(existing_role.get("company") or ""), _normalize_text(existing_role.get("title") or ""))
+        exact_index.setdefault(key, []).append(existing_role)
+    
+    matches = {}
+    for i, extracted_role in enumerate(extracted_roles):
+        key = (_normalize_text(extracted_role.get("company") or ""), _normalize_text(extracted_role.get("title") or ""))
+        candidates = exact_index.get(key)
+        if not candidates or not all(key):
+            continue
+        
+        start_year = extracted_role.get("start_year")
+        if not start_year:
+            score = int(100 * 0.4 + 100 * 0.4)
+            if score >= FUZZY_MATCH_THRESHOLD:
+                matches[i] = (candidates[0], score)
+            continue
+        
+        for candidate in candidates:
+            if candidate.get("start_year") == start_year:
+                matches[i] = (candidate, 100)
+                break
+    
+    return matches
+
+def _find_best_fuzzy_matches(
+    extracted_roles: List[Dict[str, Any]],
+    existing_roles: List[Dict[str, Any]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the best existing role index and its score for each extracted role."""
+    
+    # Score all extracted x existing pairs at once, then take each row's best;
+    # cdist's score_cutoff already skips pairs that cannot reach the threshold
+    score_matrix = _calculate_role_match_matrix(extracted_roles, existing_roles)
+    best_indices = score_matrix.argmax(axis=1)
+    return best_indices, score_matrix[np.arange(len(extracted_roles)), best_indices]
+
+def _calculate_role_match_matrix(
+    extracted_roles: List[Dict[str, Any]],
+    existing_roles: List[Dict[str, Any]]
+) -> np.ndarray:
+    """Calculate the similarity score of every extracted role against every existing role."""
+    
+    company_scores = _calculate_text_match_matrix(
+        [role.get("company") or "" for role in extracted_roles],
+        [role.get("company") or "" for role in existing_roles]
     )
     
-    title_score = fuzz.ratio(
-        role1.get("title", "").lower(),
-        role2.get("title", "").lower()
+    title_scores = _calculate_text_match_matrix(
+        [role.get("title") or "" for role in extracted_roles],
+        [role.get("title") or "" for role in existing_roles]
     )
     
-    # Date overlap scoring
-    date_score = 0
-    if role1.get("start_year") and role2.get("start_year"):
-        year_diff = abs(role1["start_year"] - role2["start_year"])
-        if year_diff <= 1:
-            date_score = 100 - (year_diff * 10)
+    # Date overlap scoring: 100 for the same start year, 90 for one year apart
+    extracted_years = _start_year_array(extracted_roles)
+    existing_years = _start_year_array(existing_roles)
+    year_diff = np.abs(extracted_years[:, None] - existing_years[None, :])
+    has_years = (extracted_years[:, None] != 0) & (existing_years[None, :] != 0)
+    date_scores = np.where(has_years & (year_diff <= 1), 100 - year_diff * 10, 0).astype(np.int16)
+    
+    # Weighted average, truncated to whole points
+    total_scores = company_scores * 0.4 + title_scores * 0.4 + date_scores * 0.2
+    return total_scores.astype(int)
+
+def _start_year_array(roles: List[Dict[str, Any]]) -> np.ndarray:
+    """Start years as a compact integer array, 0 where unknown."""
+    return np.fromiter((role.get("start_year") or 0 for role in roles), dtype=np.int32, count=len(roles))
+
+@lru_cache(maxsize=131072)
+def _normalize_text(text: str) -> str:
+    """Lowercase and normalize whitespace for fuzzy matching (memoized per session)."""
+    return utils.default_process(text)
+
+def _calculate_text_match_matrix(extracted_texts: List[str], existing_texts: List[str]) -> np.ndarray:
+    """Fuzzy-score two lists of strings, comparing each distinct normalized string once."""
+    
+    extracted_unique, extracted_index = np.unique(
+        [_normalize_text(text) for text in extracted_texts], return_inverse=True
+    )
+    existing_unique, existing_index = np.unique(
+        [_normalize_text(text) for text in existing_texts], return_inverse=True
+    )
     
-    # Weighted average
-    total_score = (company_score * 0.4 + title_score * 0.4 + date_score * 0.2)
-    return int(total_score)
+    # Repeated companies/titles collapse to one comparison; identical strings
+    # resolve in rapidfuzz's common-prefix pass without running the full DP.
+    # Pairs that cannot reach the threshold exit early and score 0. Rows are
+    # spread across all cores; rapidfuzz releases the GIL while scoring.
+    unique_scores = process.cdist(
+        extracted_unique.tolist(),
+        existing_unique.tolist(),
+        scorer=fuzz.ratio,
+        score_cutoff=MIN_FIELD_MATCH_SCORE,
+        dtype=np.float64,
+        workers=-1
+    )
+    return unique_scores[np.ix_(extracted_index, existing_index)]
 
 def _generate_role_diff(extracted: Dict[str, Any], existing: Dict[str, Any]) -> Dict[str, Any]:
     """Generate a diff of changes between extracted and existing role."""
     
     diff = {"updates": {}, "additions": {}}
     
-    # Compare all fields
-    fields_to_compare = [
-        "title", "start_year", "end_year", "start_month", "end_month",
-        "manager_title", "budget_responsibility", "headcount", "quota",
-        "location", "employment_type"
-    ]
-    
-    for field in fields_to_compare:
-        extracted_val = extracted.get(field)
-        existing_val = existing.get(field)
+    # Only compare fields the extracted role actually carries
+    for field in DIFF_SCALAR_FIELDS:
+        if field not in extracted:
+            continue
+        extracted_val = extracted[field]
+        if not extracted_val:
+            continue
         
-        if extracted_val and extracted_val != existing_val:
+        existing_val = existing.get(field)
+        if extracted_val != existing_val:
             if existing_val:
                 diff["updates"][field] = {
                     "from": existing_val,
@@ -507,38 +795,12 @@ def _generate_role_diff(extracted: Dict[str, Any], existing: Dict[str, Any]) ->
                 diff["additions"][field] = extracted_val
     
     # Handle list fields
-    list_fields = ["achievements", "responsibilities", "direct_reports", "peer_functions"]
-    for field in list_fields:
-        extracted_list = extracted.get(field, [])
-        if extracted_list:
-            diff["additions"][field] = extracted_list
+    for field in DIFF_LIST_FIELDS:
+        if extracted.get(field):
+            diff["additions"][field] = extracted[field]
     
     return diff
 
-def _extract_text_property(prop: Optional[Dict]) -> str:
-    """Extract text from Notion text property."""
-    if not prop:
-        return ""
-    
-    if prop["type"] == "title" and prop["title"]:
-        return prop["title"][0]["text"]["content"]
-    elif prop["type"] == "rich_text" and prop["rich_text"]:
-        return prop["rich_text"][0]["text"]["content"]
-    
-    return ""
-
-def _extract_number_property(prop: Optional[Dict]) -> Optional[int]:
-    """Extract number from Notion number property."""
-    if prop and prop["type"] == "number":
-        return prop["number"]
-    return None
-
-def _extract_select_property(prop: Optional[Dict]) -> str:
-    """Extract select value from Notion select property."""
-    if prop and prop["type"] == "select" and prop["select"]:
-        return prop["select"]["name"]
-    return ""
-
 if __name__ == "__main__":
     logger.info("Starting Notion Integration MCP Server...")
     mcp.run(transport="stdio") 
\ No newline at end of file
@@ -4,35 +4,60 @@ Provides comprehensive file validation and security checks before processing
 """
 
 import os
+import re
+import functools
 import hashlib
+import shutil
 import magic
 import mcp
 from mcp.server.fastmcp import FastMCP
 from pathlib import Path
 from typing import Dict, Any, List
 import logging
-from datetime import datetime
+
+# Run as a script (python mcp_servers/x.py), only mcp_servers/ is on sys.path
+try:
+    from mcp_servers.timestamps import now_compact, now_iso
+except ImportError:
+    from timestamps import now_compact, now_iso
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Security constants
-ALLOWED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.txt']
+ALLOWED_EXTENSIONS = frozenset({'.pdf', '.docx', '.doc', '.txt'})
+ALLOWED_EXTENSIONS_SORTED = sorted(ALLOWED_EXTENSIONS)  # Stable order for messages and status
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MIME_SNIFF_SIZE = 64 * 1024  # Leading bytes handed to libmagic
+HEADER_SCAN_SIZE = 1024  # Leading bytes checked for headers and suspicious content
+HASH_CHUNK_SIZE = 1024 * 1024
 UPLOAD_DIR = Path("/app/uploads")
 QUARANTINE_DIR = Path("/app/quarantine")
 
-# Ensure directories exist
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+# Absolute upload root, resolved once; secure copies must land inside it
+UPLOAD_DIR_RESOLVED = UPLOAD_DIR.resolve()
+
+# Client names are embedded in a single file name, so any path separator
+# (which covers "../x" and absolute paths) or NUL is refused
+PATH_TRAVERSAL_PATTERN = re.compile(r"[\\/\x00]")
+
+# Content that should never appear in a resume header (one case-insensitive pass)
+SUSPICIOUS_CONTENT_PATTERN = re.compile(rb'<script|javascript:|vbscript:|data:', re.IGNORECASE)
 
 # MIME type mappings for validation
 EXPECTED_MIME_TYPES = {
-    '.pdf': ['application/pdf'],
-    '.docx': ['application/vnd.openxmlformats-officedocument.wordprocessingml.document'],
-    '.doc': ['application/msword'],
-    '.txt': ['text/plain', 'text/x-plain']
+    '.pdf': frozenset({'application/pdf'}),
+    '.docx': frozenset({'application/vnd.openxmlformats-officedocument.wordprocessingml.document'}),
+    '.doc': frozenset({'application/msword'}),
+    '.txt': frozenset({'text/plain', 'text/x-plain'})
+}
+
+# Leading bytes every file of a binary format must start with (PDF, ZIP, OLE2)
+EXPECTED_FILE_SIGNATURES = {
+    '.pdf': b'%PDF-',
+    '.docx': b'PK\x03\x04',
+    '.doc': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',
 }
 
 # Initialize FastMCP server
@@ -63,72 +88,86 @@ async def validate_file_upload(file_path: str, file_size: int, client_name: str
         "file_id": "",
         "secure_path": "",
         "warnings": [],
-        "validation_timestamp": datetime.now().isoformat()
+        "validation_timestamp": now_iso()
     }
     
     try:
-        # 1. Check if file exists
-        if not os.path.exists(file_path):
-            validation_result["error"] = f"File not found: {file_path}"
+        # The client name becomes part of the secure file name
+        if PATH_TRAVERSAL_PATTERN.search(client_name):
+            validation_result["error"] = f"Invalid client name: {client_name}"
             return validation_result
         
-        # 2. Size validation
-        actual_size = os.path.getsize(file_path)
-        if actual_size != file_size:
-            validation_result["error"] = f"File size mismatch: reported {file_size}, actual {actual_size}"
-            return validation_result
-            
-        if file_size > MAX_FILE_SIZE:
-            validation_result["error"] = f"File too large: {file_size} bytes (max: {MAX_FILE_SIZE})"
-            return validation_result
-            
-        if file_size == 0:
-            validation_result["error"] = "Empty file"
-            return validation_result
-        
-        # 3. Extension validation
-        file_ext = Path(file_path).suffix.lower()
-        if file_ext not in ALLOWED_EXTENSIONS:
-            validation_result["error"] = f"Invalid file extension: {file_ext}. Allowed: {ALLOWED_EXTENSIONS}"
+        # 1. Open once; size, type, content and hash checks all reuse this handle
+        try:
+            f = open(file_path, 'rb')
+        except FileNotFoundError:
+            validation_result["error"] = f"File not found: {file_path}"
             return validation_result
         
-        # 4. MIME type validation (if python-magic is available)
-        try:
-            detected_mime = magic.from_file(file_path, mime=True)
-            expected_mimes = EXPECTED_MIME_TYPES.get(file_ext, [])
-            
-            if detected_mime not in expected_mimes:
-                validation_result["error"] = f"MIME type mismatch: detected '{detected_mime}', expected one of {expected_mimes}"
+        with f:
+            # 2. Size validation
+            actual_size = os.fstat(f.fileno()).st_size
+            if actual_size != file_size:
+                validation_result["error"] = f"File size mismatch: reported {file_size}, actual {actual_size}"
                 return validation_result
                 
-        except Exception as e:
-            validation_result["warnings"].append(f"MIME type check failed: {str(e)}")
-            logger.warning(f"MIME type validation failed for {file_path}: {e}")
-        
-        # 5. File content basic validation
-        try:
-            with open(file_path, 'rb') as f:
-                header = f.read(1024)  # Read first 1KB
+            if file_size > MAX_FILE_SIZE:
+                validation_result["error"] = f"File too large: {file_size} bytes (max: {MAX_FILE_SIZE})"
+                return validation_result
+                
+            if file_size == 0:
+                validation_result["error"] = "Empty file"
+                return validation_result
+            
+            # 3. Extension validation
+            file_ext = Path(file_path).suffix.lower()
+            if file_ext not in ALLOWED_EXTENSIONS:
+                validation_result["error"] = f"Invalid file extension: {file_ext}. Allowed: {ALLOWED_EXTENSIONS_SORTED}"
+                return validation_result
+            
+            try:
+                leading_bytes = f.read(MIME_SNIFF_SIZE)
+            except Exception as e:
+                validation_result["error"] = f"File content validation failed: {str(e)}"
+                return validation_result
+            
+            # 4. MIME type validation (if python-magic is available)
+            try:
+                detected_mime = _get_mime_detector().from_buffer(leading_bytes)
+                expected_mimes = EXPECTED_MIME_TYPES.get(file_ext, frozenset())
                 
-                # Basic header validation
-                if file_ext == '.pdf' and not header.startswith(b'%PDF-'):
-                    validation_result["error"] = "Invalid PDF header"
+                if detected_mime not in expected_mimes:
+                    validation_result["error"] = f"MIME type mismatch: detected '{detected_mime}', expected one of {sorted(expected_mimes)}"
                     return validation_result
                     
-                # Check for suspicious content patterns
-                suspicious_patterns = [b'<script', b'javascript:', b'vbscript:', b'data:']
-                for pattern in suspicious_patterns:
-                    if pattern in header.lower():
-                        validation_result["error"] = f"Suspicious content detected: {pattern.decode('utf-8', errors='ignore')}"
-                        return validation_result
-                        
-        except Exception as e:
-            validation_result["error"] = f"File content validation failed: {str(e)}"
-            return validation_result
+            except Exception as e:
+                validation_result["warnings"].append(f"MIME type check failed: {str(e)}")
+                logger.warning("MIME type validation failed for %s: %s", file_path, e)
+            
+            # 5. File content basic validation
+            header = leading_bytes[:HEADER_SCAN_SIZE]
+            
+            # Basic header validation
+            signature = EXPECTED_FILE_SIGNATURES.get(file_ext)
+            if signature and not header.startswith(signature):
+                validation_result["error"] = f"Invalid {file_ext[1:].upper()} header"
+                return validation_result
+                
+            # Check for suspicious content patterns
+            suspicious_match = SUSPICIOUS_CONTENT_PATTERN.search(header)
+            if suspicious_match:
+                pattern = suspicious_match.group(0).lower()
+                validation_result["error"] = f"Suspicious content detected: {pattern.decode('utf-8', errors='ignore')}"
+                return validation_result
+            
+            # 6. Hash the bytes already read, then stream the remainder
+            content_hasher = _get_content_hasher()(leading_bytes)
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                content_hasher.update(chunk)
+            content_hash = content_hasher.hexdigest()
         
-        # 6. Generate secure file ID and path
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        content_hash = _calculate_file_hash(file_path)
+        # 7. Generate secure file ID and path
+        timestamp = now_compact()
         file_id = f"{timestamp}_{content_hash[:12]}_{client_name}"
         
         # Create secure filename
@@ -142,14 +181,15 @@ async def validate_file_upload(file_path: str, file_size: int, client_name: str
             "secure_path": str(secure_path),
             "original_filename": original_name,
             "content_hash": content_hash,
+            "hash_algorithm": content_hasher.name,
             "detected_mime_type": detected_mime if 'detected_mime' in locals() else "unknown"
         })
         
-        logger.info(f"File validation successful: {file_path} -> {file_id}")
+        logger.info("File validation successful: %s -> %s", file_path, file_id)
         
     except Exception as e:
         validation_result["error"] = f"Validation failed with exception: {str(e)}"
-        logger.error(f"File validation exception for {file_path}: {e}")
+        logger.error("File validation exception for %s: %s", file_path, e)
     
     return validation_result
 
@@ -171,19 +211,23 @@ async def sanitize_and_move_file(source_path: str, secure_path: str, file_id: st
         "success": False,
         "secure_path": "",
         "error": "",
-        "moved_timestamp": datetime.now().isoformat()
+        "moved_timestamp": now_iso()
     }
     
     try:
         source = Path(source_path)
         target = Path(secure_path)
         
+        # Refuse targets that resolve (through "..", or symlinks) outside the upload directory
+        if not target.resolve().is_relative_to(UPLOAD_DIR_RESOLVED):
+            result["error"] = f"Secure path outside upload directory: {secure_path}"
+            return result
+        
         # Ensure target directory exists
         target.parent.mkdir(parents=True, exist_ok=True)
         
         # Copy file to secure location (don't move original yet)
-        import shutil
-        shutil.copy2(source, target)
+        _copy_file(source, target)
         
         # Set restrictive permissions (read-only)
         target.chmod(0o444)
@@ -196,13 +240,13 @@ async def sanitize_and_move_file(source_path: str, secure_path: str, file_id: st
                 "file_size": target.stat().st_size
             })
             
-            logger.info(f"File successfully moved to secure location: {file_id}")
+            logger.info("File successfully moved to secure location: %s", file_id)
         else:
             result["error"] = "File copy verification failed"
             
     except Exception as e:
         result["error"] = f"File move operation failed: {str(e)}"
-        logger.error(f"File move failed for {file_id}: {e}")
+        logger.error("File move failed for %s: %s", file_id, e)
     
     return result
 
@@ -232,12 +276,11 @@ async def quarantine_file(file_path: str, reason: str) -> Dict[str, Any]:
             return result
         
         # Create quarantine filename with timestamp and reason
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = now_compact()
         quarantine_filename = f"QUARANTINE_{timestamp}_{source.name}"
-        quarantine_path = QUARANTINE_DIR / quarantine_filename
+        quarantine_path = _ensure_directory(QUARANTINE_DIR) / quarantine_filename
         
         # Move to quarantine
-        import shutil
         shutil.move(str(source), str(quarantine_path))
         
         # Create quarantine metadata file
@@ -245,7 +288,7 @@ async def quarantine_file(file_path: str, reason: str) -> Dict[str, Any]:
         with open(metadata_path, 'w') as f:
             f.write(f"Quarantine Reason: {reason}\n")
             f.write(f"Original Path: {file_path}\n")
-            f.write(f"Quarantine Time: {datetime.now().isoformat()}\n")
+            f.write(f"Quarantine Time: {now_iso()}\n")
         
         result.update({
             "quarantined": True,
@@ -253,11 +296,11 @@ async def quarantine_file(file_path: str, reason: str) -> Dict[str, Any]:
             "metadata_path": str(metadata_path)
         })
         
-        logger.warning(f"File quarantined: {file_path} -> {quarantine_path} (Reason: {reason})")
+        logger.warning("File quarantined: %s -> %s (Reason: %s)", file_path, quarantine_path, reason)
         
     except Exception as e:
         result["error"] = f"Quarantine operation failed: {str(e)}"
-        logger.error(f"Quarantine failed for {file_path}: {e}")
+        logger.error("Quarantine failed for %s: %s", file_path, e)
     
     return result
 
@@ -271,34 +314,71 @@ async def get_security_status() -> Dict[str, Any]:
     """
     
     try:
-        upload_count = len(list(UPLOAD_DIR.glob('*'))) if UPLOAD_DIR.exists() else 0
-        quarantine_count = len(list(QUARANTINE_DIR.glob('*.metadata'))) if QUARANTINE_DIR.exists() else 0
+        upload_count = _count_directory_entries(UPLOAD_DIR)
+        quarantine_count = _count_directory_entries(QUARANTINE_DIR, suffix='.metadata')
         
         return {
             "status": "active",
-            "allowed_extensions": ALLOWED_EXTENSIONS,
+            "allowed_extensions": ALLOWED_EXTENSIONS_SORTED,
             "max_file_size_mb": MAX_FILE_SIZE // (1024 * 1024),
             "upload_directory": str(UPLOAD_DIR),
             "quarantine_directory": str(QUARANTINE_DIR),
             "files_in_upload": upload_count,
             "files_quarantined": quarantine_count,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
     except Exception as e:
         return {
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
 
-def _calculate_file_hash(file_path: str) -> str:
-    """Calculate SHA256 hash of file content."""
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(chunk)
-    return sha256_hash.hexdigest()
+@functools.cache
+def _ensure_directory(directory: Path) -> Path:
+    """Create a working directory on first use (the Docker image pre-creates them)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+def _count_directory_entries(directory: Path, suffix: str = "") -> int:
+    """Count entries (optionally by name suffix) without building Path objects; 0 if missing."""
+    try:
+        with os.scandir(directory) as entries:
+            return sum(1 for entry in entries if entry.name.endswith(suffix))
+    except FileNotFoundError:
+        return 0
+
+def _copy_file(source: Path, target: Path) -> None:
+    """Copy contents in-kernel with copy_file_range (reflink where supported), then metadata."""
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except (AttributeError, OSError):
+            # Not Linux or not supported across these filesystems; both file
+            # offsets have advanced together, so finish with a buffered copy
+            pass
+        shutil.copyfileobj(src, dst)
+    shutil.copystat(source, target)
+
+@functools.cache
+def _get_content_hasher():
+    """Hash constructor for content IDs: multi-threaded BLAKE3 if installed, else SHA-256."""
+    try:
+        import blake3
+    except ImportError:
+        return hashlib.sha256
+    return functools.partial(blake3.blake3, max_threads=blake3.blake3.AUTO)
+
+@functools.cache
+def _get_mime_detector() -> magic.Magic:
+    """Load the libmagic database once and reuse it for every upload."""
+    return magic.Magic(mime=True)
 
 if __name__ == "__main__":
     logger.info("Starting Security Gateway MCP Server...")
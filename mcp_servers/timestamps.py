@@ -0,0 +1,27 @@
+"""
+Shared UTC timestamp helpers for the MCP servers
+Formats the wall clock once per second, however many results are stamped in it
+"""
+
+import time
+from datetime import datetime, timezone
+
+# (epoch second, ISO 8601, compact) forms of the last formatted timestamp
+_timestamp_cache = [0, "", ""]
+
+def _refresh_timestamp_cache() -> None:
+    """Reformat the cached UTC timestamps when the wall-clock second changes."""
+    now = int(time.time())
+    if now != _timestamp_cache[0]:
+        moment = datetime.fromtimestamp(now, timezone.utc)
+        _timestamp_cache[:] = [now, moment.isoformat(), moment.strftime("%Y%m%d_%H%M%S")]
+
+def now_iso() -> str:
+    """Return the current UTC time as an ISO 8601 string, formatted once per second."""
+    _refresh_timestamp_cache()
+    return _timestamp_cache[1]
+
+def now_compact() -> str:
+    """Return the current UTC time as YYYYmmdd_HHMMSS for file names."""
+    _refresh_timestamp_cache()
+    return _timestamp_cache[2]
@@ -4,10 +4,23 @@ Basic system validation tests for the Resume Automation System
 
 import pytest
 import os
-import tempfile
 from pathlib import Path
 
 
+def _directory_entries(directory):
+    """Map entry names to os.DirEntry objects for a directory (empty if it is missing)."""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name: entry for entry in entries}
+    except FileNotFoundError:
+        return {}
+
+
+def _missing_keywords(content, keywords):
+    """Return the keywords absent from content, in their listed order."""
+    return [keyword for keyword in keywords if keyword not in content]
+
+
 def test_import_basic_modules():
     """Test that basic modules can be imported without errors."""
     
@@ -40,8 +53,8 @@ def test_environment_variables():
         "NOTION_DATABASE_ID"
     ]
     
-    for var in required_vars:
-        assert var in content, f"Required environment variable {var} should be documented"
+    missing = _missing_keywords(content, required_vars)
+    assert not missing, f"Required environment variables should be documented: {missing}"
     
     print("✅ Environment configuration template is complete")
 
@@ -56,9 +69,12 @@ def test_file_structure():
         "tests"
     ]
     
+    # One scandir per parent directory; DirEntry type checks need no extra stat
+    listings = {".": _directory_entries(".")}
+    
     for dir_name in required_dirs:
-        dir_path = Path(dir_name)
-        assert dir_path.exists() and dir_path.is_dir(), f"Directory {dir_name} should exist"
+        entry = listings["."].get(dir_name)
+        assert entry is not None and entry.is_dir(), f"Directory {dir_name} should exist"
     
     required_files = [
         "app.py",
@@ -72,8 +88,12 @@ def test_file_structure():
     ]
     
     for file_name in required_files:
-        file_path = Path(file_name)
-        assert file_path.exists() and file_path.is_file(), f"File {file_name} should exist"
+        parent, _, name = file_name.rpartition("/")
+        parent = parent or "."
+        if parent not in listings:
+            listings[parent] = _directory_entries(parent)
+        entry = listings[parent].get(name)
+        assert entry is not None and entry.is_file(), f"File {file_name} should exist"
     
     print("✅ File structure is complete")
 
@@ -98,8 +118,8 @@ def test_requirements_file():
         "python-magic"
     ]
     
-    for package in required_packages:
-        assert package in content, f"Required package {package} should be in requirements.txt"
+    missing = _missing_keywords(content, required_packages)
+    assert not missing, f"Required packages should be in requirements.txt: {missing}"
     
     print("✅ Requirements file contains necessary packages")
 
@@ -193,11 +213,11 @@ def test_security_considerations():
         "MAX_FILE_SIZE", 
         "validate_file_upload",
         "quarantine_file",
-        "magic.from_file"  # MIME type checking
+        "EXPECTED_MIME_TYPES"  # MIME type checking
     ]
     
-    for feature in security_features:
-        assert feature in content, f"Security feature {feature} should be implemented"
+    missing = _missing_keywords(content, security_features)
+    assert not missing, f"Security features should be implemented: {missing}"
     
     print("✅ Basic security features are implemented")
 
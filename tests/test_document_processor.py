@@ -0,0 +1,222 @@
+"""
+Unit tests for the document processor's parsing helpers
+"""
+
+import asyncio
+import zipfile
+
+import pytest
+
+document_processor = pytest.importorskip("mcp_servers.document_processor")
+
+
+@pytest.mark.parametrize("value, expected", [
+    (2019, 2019),
+    ("2019", 2019),
+    (" 2019 ", 2019),
+    ("2019.0", 2019),
+    (2019.0, 2019),
+    (2019.5, None),
+    ("2019.5", None),
+    ("present", None),
+    ("Present", None),
+    ("", None),
+    (None, None),
+    (True, None),
+    (False, None),
+    ("²⁰¹⁹", None),
+    (["2019"], None),
+])
+def test_coerce_int(value, expected):
+    """Test that year/month values normalize to int or None."""
+
+    assert document_processor._coerce_int(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, []),
+    ("", []),
+    ([], []),
+    ("Led a team of 12", ["Led a team of 12"]),
+    ("  padded  ", ["padded"]),
+    (["Python", " SQL ", "", "   "], ["Python", "SQL"]),
+    (["Python", 3, None, {"skill": "SQL"}, "Go"], ["Python", "Go"]),
+    ({"skill": "SQL"}, []),
+    (42, []),
+])
+def test_coerce_str_list(value, expected):
+    """Test that list fields normalize to a list of non-empty strings."""
+
+    assert document_processor._coerce_str_list(value) == expected
+
+
+class _WordTokenizer:
+    """Stand-in tokenizer counting whitespace-separated words."""
+
+    def encode(self, text):
+        return text.split()
+
+
+@pytest.fixture(params=["estimate", "tokenizer"])
+def tokenizer(request, monkeypatch):
+    """Run budget tests with the 4-characters-per-token estimate and with a tokenizer."""
+
+    tokenizer = None if request.param == "estimate" else _WordTokenizer()
+    monkeypatch.setattr(document_processor, "_get_tokenizer", lambda: tokenizer)
+    return tokenizer
+
+
+def test_count_tokens_without_tokenizer(monkeypatch):
+    """Test that token counts fall back to ~4 characters per token."""
+
+    monkeypatch.setattr(document_processor, "_get_tokenizer", lambda: None)
+
+    assert document_processor._count_tokens("") == 0
+    assert document_processor._count_tokens("a" * 400) == 100
+
+
+def test_truncate_under_budget_passthrough(tokenizer):
+    """Test that resumes within the budget reach the prompt unchanged."""
+
+    text = "Senior Engineer at XYZ Corp\n\nReferences\nAvailable on request"
+
+    assert document_processor._truncate_for_budget(text, max_tokens=1000) is text
+
+
+def test_truncate_drops_noise_sections_first(tokenizer):
+    """Test that trailing reference sections are cut before the resume body."""
+
+    body = "Senior Engineer at XYZ Corp, 2019 - Present\n" * 5
+    text = body + "References:\n" + "Jane Doe, former manager\n" * 200
+    max_tokens = document_processor._count_tokens(body) + 5
+
+    truncated = document_processor._truncate_for_budget(text, max_tokens=max_tokens)
+
+    assert truncated == body.rstrip()
+    assert document_processor.TRUNCATION_MARKER not in truncated
+
+
+@pytest.mark.parametrize("max_tokens", [10, 100, document_processor.MAX_PROMPT_TOKENS])
+def test_truncate_over_budget_keeps_head_and_tail(tokenizer, max_tokens):
+    """Test that over-budget resumes keep their head and tail within the budget."""
+
+    words = [f"word{i}" for i in range(max_tokens * 10)]
+    text = "HEAD " + " ".join(words) + " TAIL"
+
+    truncated = document_processor._truncate_for_budget(text, max_tokens=max_tokens)
+
+    assert document_processor._count_tokens(truncated) <= max_tokens
+    assert document_processor.TRUNCATION_MARKER in truncated
+    assert truncated.startswith("HEAD ")
+    assert truncated.endswith(" TAIL")
+
+
+@pytest.mark.parametrize("response_text, expected", [
+    ('```json\n[{"company": "XYZ Corp"}]\n```', '[{"company": "XYZ Corp"}]'),
+    ('```\n[{"company": "XYZ Corp"}]\n```', '[{"company": "XYZ Corp"}]'),
+    ('```json[]```', '[]'),
+    ('  \n```json\n  {"roles": []}  \n```\n\n', '{"roles": []}'),
+    ('[{"company": "XYZ Corp"}]', '[{"company": "XYZ Corp"}]'),
+    ('\n  [{"company": "XYZ Corp"}]  \n', '[{"company": "XYZ Corp"}]'),
+    ('[{"summary": "uses ``` in text"}]', '[{"summary": "uses ``` in text"}]'),
+])
+def test_strip_code_fence(response_text, expected):
+    """Test that JSON is recovered from fenced and unfenced Claude responses."""
+
+    assert document_processor._strip_code_fence(response_text) == expected
+
+
+DOCX_DOCUMENT_XML = (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:r><w:t>Jane Doe</w:t></w:r></w:p>'
+    '<w:p><w:pPr><w:tabs><w:tab w:val="right" w:pos="9000"/></w:tabs></w:pPr>'
+    '<w:r><w:rPr><w:b/></w:rPr><w:t>Senior Engineer</w:t><w:tab/><w:t>2019 - 2021</w:t></w:r></w:p>'
+    '<w:p><w:r><w:t xml:space="preserve">Line one </w:t><w:br/></w:r>'
+    '<w:hyperlink><w:r><w:t>Line two</w:t></w:r></w:hyperlink><w:r><w:cr/><w:t>Line three</w:t></w:r></w:p>'
+    '<w:p/>'
+    '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>Led a team of 12</w:t></w:r></w:p></w:tc>'
+    '<w:tc><w:p><w:r><w:t>Budget</w:t><w:tab/><w:t>$2M</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+    '<w:p><w:r><w:t>After the table</w:t></w:r></w:p>'
+    '<w:sectPr/></w:body></w:document>'
+)
+
+DOCX_EXPECTED_TEXT = (
+    "Jane Doe\n"
+    "Senior Engineer\t2019 - 2021\n"
+    "Line one \nLine two\nLine three\n"
+    "Led a team of 12\n"
+    "Budget\t$2M\n"
+    "After the table"
+)
+
+
+def test_docx_etree_fallback_matches_lxml(tmp_path, monkeypatch):
+    """Test that the stdlib ElementTree fallback extracts the same DOCX text as lxml."""
+
+    pytest.importorskip("lxml")
+    docx_path = tmp_path / "resume.docx"
+    with zipfile.ZipFile(docx_path, "w") as archive:
+        archive.writestr("word/document.xml", DOCX_DOCUMENT_XML)
+
+    # Call the undecorated extractor so the extraction cache cannot serve the second run
+    extract_from_docx = document_processor._extract_from_docx.__wrapped__
+    lxml_text = extract_from_docx(str(docx_path))
+
+    monkeypatch.setattr(document_processor, "_get_etree", lambda: None)
+    etree_text = extract_from_docx(str(docx_path))
+
+    assert lxml_text == DOCX_EXPECTED_TEXT
+    assert etree_text == lxml_text
+
+
+RESUME_LINE = "Senior Engineer at XYZ Corp, 2019 - Present"
+
+
+@pytest.mark.parametrize("data", [
+    f"{RESUME_LINE} – Zürich\n".encode("utf-8"),
+    f"{RESUME_LINE} - Zürich\n".encode("latin-1"),
+])
+def test_extract_text_decodes_txt(tmp_path, data):
+    """Test that UTF-8 and Latin-1 text resumes both decode their non-ASCII text."""
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(data)
+
+    result = asyncio.run(document_processor.extract_text_from_file(str(resume_path), "txt"))
+
+    assert result["success"], result["error"]
+    assert result["text"].startswith(RESUME_LINE)
+    assert "Zürich" in result["text"]
+
+
+def test_extract_text_rejects_empty_txt(tmp_path):
+    """Test that an empty text file is not reported as a successful extraction."""
+
+    resume_path = tmp_path / "empty.txt"
+    resume_path.write_bytes(b"")
+
+    result = asyncio.run(document_processor.extract_text_from_file(str(resume_path), "txt"))
+
+    assert not result["success"]
+
+
+def test_extract_text_from_docx(tmp_path):
+    """Test that DOCX text keeps tabs, line breaks and table cells through the public tool."""
+
+    docx_path = tmp_path / "resume.docx"
+    with zipfile.ZipFile(docx_path, "w") as archive:
+        archive.writestr("word/document.xml", DOCX_DOCUMENT_XML)
+
+    result = asyncio.run(document_processor.extract_text_from_file(str(docx_path), "docx"))
+
+    assert result["success"], result["error"]
+    assert result["text"] == DOCX_EXPECTED_TEXT
+
+
+def test_extract_text_reports_missing_file(tmp_path):
+    """Test that a missing file is reported rather than raised."""
+
+    result = asyncio.run(document_processor.extract_text_from_file(str(tmp_path / "missing.txt"), "txt"))
+
+    assert not result["success"]
+    assert result["error"].startswith("File not found")
@@ -0,0 +1,455 @@
+"""
+Unit tests for the Notion integration server's role matching
+"""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+notion_integration = pytest.importorskip("mcp_servers.notion_integration")
+
+from rapidfuzz import fuzz, utils
+
+FUZZY_MATCH_THRESHOLD = notion_integration.FUZZY_MATCH_THRESHOLD
+
+
+def _reference_role_match_score(role1, role2):
+    """The scalar pair scorer find_role_matches used before the cdist score matrix."""
+
+    company_score = fuzz.ratio(
+        role1.get("company") or "",
+        role2.get("company") or "",
+        processor=utils.default_process
+    )
+
+    title_score = fuzz.ratio(
+        role1.get("title") or "",
+        role2.get("title") or "",
+        processor=utils.default_process
+    )
+
+    date_score = 0
+    if role1.get("start_year") and role2.get("start_year"):
+        year_diff = abs(role1["start_year"] - role2["start_year"])
+        if year_diff <= 1:
+            date_score = 100 - (year_diff * 10)
+
+    return int(company_score * 0.4 + title_score * 0.4 + date_score * 0.2)
+
+
+def _reference_best_match(extracted_role, existing_roles):
+    """Best existing role and score by the scalar loop: first strictly better score wins."""
+
+    best_match, best_score = None, 0
+    for existing_role in existing_roles:
+        score = _reference_role_match_score(extracted_role, existing_role)
+        if score > best_score and score >= FUZZY_MATCH_THRESHOLD:
+            best_match, best_score = existing_role, score
+    return best_match, best_score
+
+
+def _find_role_matches(extracted_roles, existing_roles):
+    """Run the find_role_matches tool and return (existing role, score) per extracted role."""
+
+    result = asyncio.run(notion_integration.find_role_matches(extracted_roles, existing_roles))
+    assert "error" not in result, result.get("error")
+
+    matches = {id(match["extracted_role"]): (match["existing_role"], match["match_score"]) for match in result["matches"]}
+    return [matches.get(id(role), (None, 0)) for role in extracted_roles]
+
+
+def _assert_matches_reference(extracted_roles, existing_roles):
+    """Assert find_role_matches picks the same existing role and score as the scalar loop."""
+
+    actual = _find_role_matches(extracted_roles, existing_roles)
+    for extracted_role, (match, score) in zip(extracted_roles, actual):
+        expected_match, expected_score = _reference_best_match(extracted_role, existing_roles)
+        assert match is expected_match, f"{extracted_role} matched {match}, expected {expected_match}"
+        assert score == expected_score, f"{extracted_role} scored {score}, expected {expected_score}"
+
+
+def test_match_score_at_threshold():
+    """Test that a role scoring exactly the threshold matches and one point below does not."""
+
+    existing_roles = [{"company": "XYZ Corp", "title": "Engineering Manager", "start_year": 2019}]
+    at_threshold = {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019}
+    below_threshold = {"company": "XYZ Corp", "title": "Staff Engineer", "start_year": 2019}
+
+    assert _reference_role_match_score(at_threshold, existing_roles[0]) == FUZZY_MATCH_THRESHOLD
+    assert _reference_role_match_score(below_threshold, existing_roles[0]) == FUZZY_MATCH_THRESHOLD - 1
+
+    at_match, below_match = _find_role_matches([at_threshold, below_threshold], existing_roles)
+    assert at_match == (existing_roles[0], FUZZY_MATCH_THRESHOLD)
+    assert below_match == (None, 0)
+
+
+@pytest.mark.parametrize("extracted_role", [
+    {"company": None, "title": "Data Engineer", "start_year": 2019},
+    {"company": "", "title": "Data Engineer", "start_year": 2019},
+    {"title": "Data Engineer", "start_year": 2019},
+    {"company": "XYZ Corp", "title": None, "start_year": 2019},
+    {"company": None, "title": None, "start_year": 2019},
+    {"company": "", "title": ""},
+])
+def test_match_empty_company_or_title(extracted_role):
+    """Test that empty, None and missing company/title score like the scalar loop."""
+
+    existing_roles = [
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019},
+        {"company": None, "title": "Data Engineer", "start_year": 2019},
+        {"company": "", "title": "", "start_year": None},
+        {"company": "XYZ Corp", "title": "", "start_year": 2019},
+    ]
+
+    _assert_matches_reference([extracted_role], existing_roles)
+
+
+@pytest.mark.parametrize("extracted_year, existing_year", [
+    (2019, None),
+    (None, 2019),
+    (2019, 0),
+    (2019, 2020),
+    (2019, 2021),
+])
+def test_match_start_year_on_one_side(extracted_year, existing_year):
+    """Test that a start year missing on either side earns no date score."""
+
+    extracted_role = {"company": "XYZ Corp", "title": "Senior Data Engineer", "start_year": extracted_year}
+    existing_roles = [{"company": "XYZ Corp", "title": "Data Engineer", "start_year": existing_year}]
+
+    _assert_matches_reference([extracted_role], existing_roles)
+
+
+def test_match_matrix_equals_scalar_scores():
+    """Test the score matrix against the scalar scorer on randomized roles."""
+
+    rng = random.Random(20240101)
+    companies = ["XYZ Corp", "xyz corp.", "Acme", "ACME Inc", "Globex", "", None, "Initech LLC"]
+    titles = ["Data Engineer", "Senior Data Engineer", "Engineering Manager", "Data Analyst", "CTO", "", None]
+    years = [None, 2017, 2018, 2019, 2020]
+
+    def random_role():
+        return {"company": rng.choice(companies), "title": rng.choice(titles), "start_year": rng.choice(years)}
+
+    for _ in range(20):
+        extracted_roles = [random_role() for _ in range(rng.randint(1, 12))]
+        existing_roles = [random_role() for _ in range(rng.randint(1, 25))]
+
+        _assert_matches_reference(extracted_roles, existing_roles)
+
+        score_matrix = notion_integration._calculate_role_match_matrix(extracted_roles, existing_roles)
+        for i, extracted_role in enumerate(extracted_roles):
+            for j, existing_role in enumerate(existing_roles):
+                expected = _reference_role_match_score(extracted_role, existing_role)
+                # Pairs that cannot reach the threshold may be cut off early and score lower
+                if expected >= FUZZY_MATCH_THRESHOLD:
+                    assert score_matrix[i, j] == expected
+                else:
+                    assert score_matrix[i, j] < FUZZY_MATCH_THRESHOLD
+
+
+def test_exact_match_with_start_year():
+    """Test that an exact company/title/start-year match scores 100 without fuzzy scoring."""
+
+    existing_roles = [
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2015},
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019},
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019},
+    ]
+    extracted_roles = [{"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019}]
+
+    matches = notion_integration._find_exact_role_matches(extracted_roles, existing_roles)
+
+    assert matches == {0: (existing_roles[1], 100)}
+    _assert_matches_reference(extracted_roles, existing_roles)
+
+
+def test_exact_match_without_start_year():
+    """Test that an exact company/title match with no extracted start year scores 80."""
+
+    existing_roles = [
+        {"company": "Acme", "title": "CTO", "start_year": 2010},
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2015},
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019},
+    ]
+    extracted_roles = [{"company": "XYZ Corp", "title": "Data Engineer", "start_year": None}]
+
+    matches = notion_integration._find_exact_role_matches(extracted_roles, existing_roles)
+
+    assert matches == {0: (existing_roles[1], 80)}
+    _assert_matches_reference(extracted_roles, existing_roles)
+
+
+def test_exact_match_other_start_year_falls_through():
+    """Test that an exact company/title with a different start year is left to fuzzy scoring."""
+
+    existing_roles = [{"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2018}]
+    extracted_roles = [{"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019}]
+
+    assert notion_integration._find_exact_role_matches(extracted_roles, existing_roles) == {}
+    assert _find_role_matches(extracted_roles, existing_roles) == [(existing_roles[0], 98)]
+
+
+@pytest.mark.parametrize("company, title, exact", [
+    ("xyz corp", "data engineer", True),
+    ("  XYZ Corp.  ", "Data Engineer\n", True),
+    ("XYZ CORP", "DATA ENGINEER", True),
+    ("XYZ  Corp", "Data Engineer", False),
+    ("", "", False),
+    (None, None, False),
+])
+def test_exact_match_normalizes_case_and_whitespace(company, title, exact):
+    """Test that exact keys go through _normalize_text and still agree with fuzzy scoring."""
+
+    existing_roles = [
+        {"company": "XYZ Corp", "title": "Data Engineer", "start_year": 2019},
+        {"company": "", "title": "", "start_year": 2019},
+    ]
+    extracted_roles = [{"company": company, "title": title, "start_year": 2019}]
+
+    matches = notion_integration._find_exact_role_matches(extracted_roles, existing_roles)
+
+    assert (0 in matches) == exact
+    if exact:
+        assert matches[0] == (existing_roles[0], 100)
+    _assert_matches_reference(extracted_roles, existing_roles)
+
+
+def test_fuzzy_matches_large_database_equal_full_matrix():
+    """Test that best fuzzy matches over 500+ existing roles equal the unfiltered score matrix."""
+
+    companies = ["IBM", "HP", "GE", "EY", "PwC", "KPMG", "AWS", "SAP", "Uber", "Meta", "Intel", "Nvidia",
+                 "Cisco", "Dell", "Acme International", "JP Morgan", "Globex Corporation", "Initech LLC"]
+    titles = ["CTO", "CFO", "PM", "Engineer", "Designer", "Recruiter", "Architect", "Analyst",
+              "Senior Data Engineer", "VP, Engineering", "Software Engineer", "Staff Engineer"]
+    existing_roles = [
+        {"company": company, "title": title, "start_year": start_year}
+        for start_year in (2012, 2016, 2020)
+        for company in companies
+        for title in titles
+    ]
+    # Short company names share few bigrams, yet these still score above the threshold
+    existing_roles += [
+        {"company": "EA", "title": "Designer", "start_year": 2016},
+        {"company": "BP", "title": "Designer", "start_year": 2016},
+        {"company": "3M", "title": "Architect", "start_year": 2016},
+    ]
+    assert len(existing_roles) >= 500
+
+    # Near-duplicates of existing roles, plus same-company roles whose closest
+    # existing title is a different short word ("Intern" vs "Designer")
+    rng = random.Random(7)
+    extracted_roles = []
+    for role in rng.sample(existing_roles, 60):
+        extracted_roles.append({
+            "company": rng.choice([role["company"], role["company"].upper(), role["company"] + " Inc"]),
+            "title": rng.choice([role["title"], "Sr. " + role["title"], role["title"][:-1]]),
+            "start_year": role["start_year"] + rng.choice([0, 1]),
+        })
+    extracted_roles += [
+        {"company": company, "title": "Intern", "start_year": 2016}
+        for company in ("IBM", "HP", "GE", "SAP")
+    ]
+    extracted_roles += [
+        {"company": "EA", "title": "Intern", "start_year": 2016},
+        {"company": "BP", "title": "Engineer", "start_year": 2016},
+        {"company": "3M", "title": "Recruiter", "start_year": 2017},
+    ]
+    extracted_roles.append({"company": "Unknown Startup", "title": "Founder", "start_year": 2019})
+
+    best_indices, best_scores = notion_integration._find_best_fuzzy_matches(extracted_roles, existing_roles)
+    score_matrix = notion_integration._calculate_role_match_matrix(extracted_roles, existing_roles)
+
+    for i, extracted_role in enumerate(extracted_roles):
+        expected_score = score_matrix[i].max()
+        if expected_score >= FUZZY_MATCH_THRESHOLD:
+            assert best_scores[i] == expected_score, f"{extracted_role} lost its best candidate"
+            assert best_indices[i] == score_matrix[i].argmax()
+        else:
+            assert best_scores[i] < FUZZY_MATCH_THRESHOLD
+
+    _assert_matches_reference(extracted_roles, existing_roles)
+
+
+class _PagedDatabase:
+    """Fake notion.databases serving a client's rows in cursor-linked pages."""
+
+    def __init__(self, row_count):
+        self.rows = [
+            {"id": f"page-{i}", "url": "", "created_time": "", "last_edited_time": "", "properties": {}}
+            for i in range(row_count)
+        ]
+        self.requests = []
+
+    async def query(self, database_id, filter, page_size, start_cursor=None):
+        self.requests.append({"page_size": page_size, "start_cursor": start_cursor})
+        start = int(start_cursor) if start_cursor else 0
+        end = min(start + page_size, len(self.rows))
+        has_more = end < len(self.rows)
+        return {
+            "results": self.rows[start:end],
+            "has_more": has_more,
+            "next_cursor": str(end) if has_more else None,
+        }
+
+
+@pytest.fixture
+def paged_database(monkeypatch):
+    """Patch the Notion client with a paged fake holding 250 rows."""
+
+    database = _PagedDatabase(250)
+    monkeypatch.setattr(notion_integration, "notion", SimpleNamespace(databases=database))
+    return database
+
+
+@pytest.mark.parametrize("limit, page_sizes, has_more, next_cursor", [
+    (1, [1], True, "1"),
+    (100, [100], True, "100"),
+    (101, [100, 1], True, "101"),
+    (150, [100, 50], True, "150"),
+    (250, [100, 100, 50], False, None),
+    (300, [100, 100, 100], False, None),
+])
+def test_query_existing_roles_limit_boundaries(paged_database, limit, page_sizes, has_more, next_cursor):
+    """Test that queries stop at the limit and report where the next query resumes."""
+
+    result = asyncio.run(notion_integration.query_existing_roles("Jane Doe", limit=limit))
+
+    assert result["success"], result["error"]
+    assert [role["notion_id"] for role in result["roles"]] == [f"page-{i}" for i in range(min(limit, 250))]
+    assert result["total_count"] == min(limit, 250)
+    assert result["has_more"] is has_more
+    assert result["next_cursor"] == next_cursor
+    assert [request["page_size"] for request in paged_database.requests] == page_sizes
+
+
+def test_roles_batch_keeps_order_and_survives_failures(monkeypatch):
+    """Test that batch results follow input order and one failed role does not abort the rest."""
+
+    async def fake_create_or_update_role(role_data, citations, client_name, existing_role_id=None):
+        # Later roles finish first, so completion order is the reverse of input order
+        await asyncio.sleep(0.001 * (10 - role_data["index"]))
+        if role_data["title"] == "Rejected":
+            return {"success": False, "page_id": "", "action": "", "error": "validation_error"}
+        if role_data["title"] == "Broken":
+            raise RuntimeError("connection reset")
+        return {
+            "success": True,
+            "page_id": f"page-{role_data['index']}",
+            "action": "updated" if existing_role_id else "created",
+            "error": "",
+        }
+
+    monkeypatch.setattr(notion_integration, "create_or_update_role", fake_create_or_update_role)
+    titles = ["Engineer", "Rejected", "Manager", "Broken", "Director", "CTO"]
+    items = [
+        {"role_data": {"index": index, "title": title}, "existing_role_id": "existing" if index % 2 else None}
+        for index, title in enumerate(titles)
+    ]
+
+    result = asyncio.run(notion_integration.create_or_update_roles_batch(items, "Jane Doe"))
+
+    assert [r["page_id"] for r in result["results"]] == ["page-0", "", "page-2", "", "page-4", "page-5"]
+    assert result["results"][1]["error"] == "validation_error"
+    assert "connection reset" in result["results"][3]["error"]
+    assert result["success"] is False
+    assert result["failed_count"] == 2
+    assert result["created_count"] == 3
+    assert result["updated_count"] == 1
+
+
+def test_iter_existing_roles_early_break_cancels_prefetch(monkeypatch):
+    """Test that breaking out under aclosing cancels the prefetched page instead of awaiting it."""
+
+    database = _PagedDatabase(250)
+    page_released = asyncio.Event()
+    completed_cursors = []
+
+    async def query(database_id, filter, page_size, start_cursor=None):
+        if start_cursor:
+            # Later pages hang until released, so finishing one means it was awaited
+            await page_released.wait()
+        response = await database.query(database_id, filter, page_size, start_cursor)
+        completed_cursors.append(start_cursor)
+        return response
+
+    monkeypatch.setattr(notion_integration, "notion", SimpleNamespace(databases=SimpleNamespace(query=query)))
+
+    async def consume_first_roles():
+        roles = []
+        async with notion_integration.aclosing(notion_integration.iter_existing_roles("Jane Doe")) as stream:
+            async for role in stream:
+                roles.append(role)
+                if len(roles) == 3:
+                    break
+
+        # Give a leaked prefetch every chance to run to completion
+        page_released.set()
+        await asyncio.sleep(0.01)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return roles, pending
+
+    roles, pending = asyncio.run(consume_first_roles())
+
+    assert [role.notion_id for role in roles] == ["page-0", "page-1", "page-2"]
+    assert [request["start_cursor"] for request in database.requests] == [None]
+    assert completed_cursors == [None]
+    assert pending == []
+
+
+def test_role_diff_follows_field_order():
+    """Test that diff keys follow the declared field order, not the extracted role's key order."""
+
+    extracted = {
+        "peer_functions": ["Sales"],
+        "location": "Remote",
+        "achievements": ["Shipped v2"],
+        "title": "Staff Engineer",
+        "end_year": 2023,
+        "start_year": 2019,
+        "quota": None,
+    }
+    existing = {"title": "Senior Engineer", "start_year": 2019}
+
+    diff = notion_integration._generate_role_diff(extracted, existing)
+
+    assert diff["updates"] == {"title": {"from": "Senior Engineer", "to": "Staff Engineer"}}
+    assert list(diff["additions"]) == ["end_year", "location", "achievements", "peer_functions"]
+
+
+def test_database_schema_cache_returns_copies(monkeypatch):
+    """Test that mutating a returned schema does not change what later calls receive."""
+
+    retrieve_calls = []
+
+    async def retrieve(database_id):
+        retrieve_calls.append(database_id)
+        return {
+            "title": [{"text": {"content": "Roles"}}],
+            "url": "https://notion.so/roles",
+            "properties": {
+                "Client": {"type": "title", "id": "title"},
+                "Seniority": {"type": "select", "id": "abc", "select": {"options": [{"name": "Senior"}]}},
+            },
+        }
+
+    monkeypatch.setattr(notion_integration, "notion", SimpleNamespace(databases=SimpleNamespace(retrieve=retrieve)))
+    monkeypatch.setattr(notion_integration, "_schema_cache", {"timestamp": 0.0, "result": None})
+
+    first = asyncio.run(notion_integration.get_database_schema())
+    first["schema"]["properties"]["Seniority"]["options"].append("Intern")
+    del first["schema"]["properties"]["Client"]
+
+    second = asyncio.run(notion_integration.get_database_schema())
+    second["schema"]["title"] = "Changed"
+
+    third = asyncio.run(notion_integration.get_database_schema())
+
+    assert len(retrieve_calls) == 1
+    assert third["schema"]["title"] == "Roles"
+    assert third["schema"]["properties"] == {
+        "Client": {"type": "title", "id": "title"},
+        "Seniority": {"type": "select", "id": "abc", "options": ["Senior"]},
+    }
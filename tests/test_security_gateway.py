@@ -0,0 +1,332 @@
+"""
+Unit tests for the security gateway's upload validation
+"""
+
+import asyncio
+import hashlib
+from pathlib import Path
+
+import pytest
+
+security_gateway = pytest.importorskip("mcp_servers.security_gateway")
+
+RESUME_TEXT = b"Jane Doe\nSenior Engineer at XYZ Corp, 2019 - Present\nLed a team of 12\n"
+
+
+def _validate(path, client_name="jane_doe", file_size=None):
+    """Run validate_file_upload on a file, reporting its real size unless told otherwise."""
+
+    if file_size is None:
+        file_size = path.stat().st_size
+    return asyncio.run(security_gateway.validate_file_upload(str(path), file_size, client_name))
+
+
+class _FixedMimeDetector:
+    """Stand-in for magic.Magic reporting one MIME type, to reach the checks behind it."""
+
+    def __init__(self, mime_type):
+        self.mime_type = mime_type
+
+    def from_buffer(self, buffer):
+        return self.mime_type
+
+
+def test_validate_accepts_plain_text_resume(tmp_path):
+    """Test that a clean text resume passes and is assigned a file ID in the upload directory."""
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(RESUME_TEXT)
+
+    result = _validate(resume_path)
+
+    assert result["valid"], result["error"]
+    assert result["detected_mime_type"] == "text/plain"
+    assert result["file_id"].endswith("_jane_doe")
+    assert result["secure_path"] == str(security_gateway.UPLOAD_DIR / f"{result['file_id']}_resume.txt")
+
+
+def test_validate_reports_hash_algorithm(tmp_path):
+    """Test that the content hash is the named algorithm's digest of the whole file."""
+
+    resume_path = tmp_path / "resume.txt"
+    # Longer than the sniffed prefix so the streamed remainder is hashed too
+    content = RESUME_TEXT * (security_gateway.MIME_SNIFF_SIZE // len(RESUME_TEXT) + 10)
+    resume_path.write_bytes(content)
+
+    result = _validate(resume_path)
+
+    assert result["valid"], result["error"]
+    if result["hash_algorithm"] == "blake3":
+        blake3 = pytest.importorskip("blake3")
+        expected_hash = blake3.blake3(content).hexdigest()
+    else:
+        assert result["hash_algorithm"] == "sha256"
+        expected_hash = hashlib.sha256(content).hexdigest()
+    assert result["content_hash"] == expected_hash
+    assert result["content_hash"][:12] in result["file_id"]
+
+
+def test_validate_rejects_mime_mismatch(tmp_path):
+    """Test that text content behind a .pdf extension is rejected by the MIME check."""
+
+    resume_path = tmp_path / "resume.pdf"
+    resume_path.write_bytes(RESUME_TEXT)
+
+    result = _validate(resume_path)
+
+    assert not result["valid"]
+    assert result["error"].startswith("MIME type mismatch: detected 'text/plain'")
+    assert "application/pdf" in result["error"]
+
+
+@pytest.mark.parametrize("payload, pattern", [
+    (b"<script>alert(1)</script>", "<script"),
+    (b"<SCRIPT src=x>", "<script"),
+    (b"see javascript:void(0)", "javascript:"),
+    (b"vbscript:msgbox", "vbscript:"),
+    (b"photo: data:image/png;base64,AAAA", "data:"),
+])
+def test_validate_rejects_suspicious_header(tmp_path, monkeypatch, payload, pattern):
+    """Test that script and data URIs in the file header are rejected, whatever their case."""
+
+    # libmagic already calls "<script" text/html; pin the MIME type to test the header scan itself
+    monkeypatch.setattr(security_gateway, "_get_mime_detector", lambda: _FixedMimeDetector("text/plain"))
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(RESUME_TEXT + payload + b"\n")
+
+    result = _validate(resume_path)
+
+    assert not result["valid"]
+    assert result["error"] == f"Suspicious content detected: {pattern}"
+
+
+def test_validate_rejects_script_in_text_resume(tmp_path):
+    """Test that a text resume carrying a script tag is rejected with the real MIME detector."""
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(RESUME_TEXT + b"Portfolio <script>alert(1)</script>\n")
+
+    result = _validate(resume_path)
+
+    assert not result["valid"]
+    assert result["error"].startswith(("MIME type mismatch", "Suspicious content detected"))
+
+
+def test_validate_rejects_oversized_file(tmp_path):
+    """Test that files over MAX_FILE_SIZE are rejected before their content is read."""
+
+    resume_path = tmp_path / "resume.txt"
+    with open(resume_path, "wb") as f:
+        f.write(RESUME_TEXT)
+        # Sparse, so the test does not write 10MB to disk
+        f.truncate(security_gateway.MAX_FILE_SIZE + 1)
+
+    result = _validate(resume_path)
+
+    assert not result["valid"]
+    assert result["error"] == (
+        f"File too large: {security_gateway.MAX_FILE_SIZE + 1} bytes (max: {security_gateway.MAX_FILE_SIZE})"
+    )
+
+
+@pytest.mark.parametrize("file_name, content, error", [
+    ("resume.txt", RESUME_TEXT, "File size mismatch"),
+    ("resume.txt", b"", "Empty file"),
+    ("resume.exe", RESUME_TEXT, "Invalid file extension: .exe"),
+])
+def test_validate_rejects_size_and_extension(tmp_path, file_name, content, error):
+    """Test the size and extension checks that run before any content is read."""
+
+    resume_path = tmp_path / file_name
+    resume_path.write_bytes(content)
+    file_size = len(content) + 1 if error == "File size mismatch" else None
+
+    result = _validate(resume_path, file_size=file_size)
+
+    assert not result["valid"]
+    assert result["error"].startswith(error)
+
+
+@pytest.mark.parametrize("extension, mime_type, signature", [
+    (".pdf", "application/pdf", b"%PDF-"),
+    (".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", b"PK\x03\x04"),
+    (".doc", "application/msword", b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),
+])
+def test_validate_checks_file_signature(tmp_path, monkeypatch, extension, mime_type, signature):
+    """Test that a binary resume whose leading bytes miss its format's signature is rejected."""
+
+    # Pin the MIME type so the signature check, not libmagic, decides
+    monkeypatch.setattr(security_gateway, "_get_mime_detector", lambda: _FixedMimeDetector(mime_type))
+    body = b"\x00resume body\x00" * 8
+
+    signed_path = tmp_path / f"signed{extension}"
+    signed_path.write_bytes(signature + body)
+    assert _validate(signed_path)["valid"]
+
+    for wrong_start in (b"", signature[:-1], b"GIF89a", b"%PDF-" if extension != ".pdf" else b"PK\x03\x04"):
+        resume_path = tmp_path / f"resume{extension}"
+        resume_path.write_bytes(wrong_start + body)
+
+        result = _validate(resume_path)
+
+        assert not result["valid"]
+        assert result["error"] == f"Invalid {extension[1:].upper()} header"
+
+
+@pytest.mark.parametrize("extension", [".pdf", ".docx", ".doc"])
+def test_validate_rejects_text_with_binary_extension(tmp_path, extension):
+    """Test that plain text renamed to a binary resume format is rejected with the real MIME detector."""
+
+    resume_path = tmp_path / f"resume{extension}"
+    resume_path.write_bytes(RESUME_TEXT)
+
+    result = _validate(resume_path)
+
+    assert not result["valid"]
+    assert result["error"].startswith(("MIME type mismatch", f"Invalid {extension[1:].upper()} header"))
+
+
+@pytest.mark.parametrize("client_name", [
+    "../x",
+    "..\\x",
+    "jane/../../etc",
+    "/etc/cron.d",
+    "C:\\Windows",
+    "jane\x00doe",
+])
+def test_validate_rejects_client_name_traversal(tmp_path, client_name):
+    """Test that client names able to move the secure file out of its directory are rejected."""
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(RESUME_TEXT)
+
+    result = _validate(resume_path, client_name=client_name)
+
+    assert not result["valid"]
+    assert result["error"] == f"Invalid client name: {client_name}"
+
+
+@pytest.mark.parametrize("client_name", ["jane_doe", "Jane Doe", "o'brien..jr", "..."])
+def test_validate_allows_dotted_client_names(tmp_path, client_name):
+    """Test that dots inside a client name are not mistaken for traversal."""
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(RESUME_TEXT)
+
+    result = _validate(resume_path, client_name=client_name)
+
+    assert result["valid"], result["error"]
+    assert Path(result["secure_path"]).parent == security_gateway.UPLOAD_DIR
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Point the gateway at a temporary upload directory."""
+
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(security_gateway, "UPLOAD_DIR", upload_dir)
+    monkeypatch.setattr(security_gateway, "UPLOAD_DIR_RESOLVED", upload_dir.resolve())
+    return upload_dir
+
+
+def _sanitize_and_move(source_path, secure_path):
+    """Run sanitize_and_move_file with a fixed file ID."""
+
+    return asyncio.run(security_gateway.sanitize_and_move_file(str(source_path), str(secure_path), "file-id"))
+
+
+def test_move_into_upload_dir(tmp_path, upload_dir):
+    """Test that a secure path inside the upload directory receives a read-only copy."""
+
+    source_path = tmp_path / "resume.txt"
+    source_path.write_bytes(RESUME_TEXT)
+
+    result = _sanitize_and_move(source_path, upload_dir / "file-id_resume.txt")
+
+    assert result["success"], result["error"]
+    assert (upload_dir / "file-id_resume.txt").read_bytes() == RESUME_TEXT
+    assert (upload_dir / "file-id_resume.txt").stat().st_mode & 0o777 == 0o444
+
+
+@pytest.mark.parametrize("relative_target", [
+    "../escaped.txt",
+    "nested/../../escaped.txt",
+    "../uploads_evil/escaped.txt",
+])
+def test_move_rejects_dotdot_secure_path(tmp_path, upload_dir, relative_target):
+    """Test that ".." in the secure path cannot climb out of the upload directory."""
+
+    source_path = tmp_path / "resume.txt"
+    source_path.write_bytes(RESUME_TEXT)
+    secure_path = f"{upload_dir}/{relative_target}"
+
+    result = _sanitize_and_move(source_path, secure_path)
+
+    assert not result["success"]
+    assert result["error"] == f"Secure path outside upload directory: {secure_path}"
+    assert not (tmp_path / "escaped.txt").exists()
+    assert not (tmp_path / "uploads_evil").exists()
+
+
+def test_move_rejects_absolute_secure_path_outside(tmp_path, upload_dir):
+    """Test that an absolute secure path elsewhere on disk is rejected."""
+
+    source_path = tmp_path / "resume.txt"
+    source_path.write_bytes(RESUME_TEXT)
+    secure_path = tmp_path / "elsewhere" / "resume.txt"
+
+    result = _sanitize_and_move(source_path, secure_path)
+
+    assert not result["success"]
+    assert result["error"] == f"Secure path outside upload directory: {secure_path}"
+    assert not secure_path.parent.exists()
+
+
+def test_move_rejects_symlink_leaving_upload_dir(tmp_path, upload_dir):
+    """Test that a symlink inside the upload directory cannot redirect the copy outside it."""
+
+    source_path = tmp_path / "resume.txt"
+    source_path.write_bytes(RESUME_TEXT)
+    outside_dir = tmp_path / "outside"
+    outside_dir.mkdir()
+    (upload_dir / "link").symlink_to(outside_dir, target_is_directory=True)
+    secure_path = upload_dir / "link" / "resume.txt"
+
+    result = _sanitize_and_move(source_path, secure_path)
+
+    assert not result["success"]
+    assert result["error"] == f"Secure path outside upload directory: {secure_path}"
+    assert list(outside_dir.iterdir()) == []
+
+
+def test_move_accepts_symlinked_upload_dir(tmp_path, monkeypatch):
+    """Test that an upload directory reached through a symlink (e.g. a mounted volume) still works."""
+
+    real_upload_dir = tmp_path / "volume" / "uploads"
+    real_upload_dir.mkdir(parents=True)
+    upload_dir = tmp_path / "uploads"
+    upload_dir.symlink_to(real_upload_dir, target_is_directory=True)
+    monkeypatch.setattr(security_gateway, "UPLOAD_DIR", upload_dir)
+    monkeypatch.setattr(security_gateway, "UPLOAD_DIR_RESOLVED", upload_dir.resolve())
+    source_path = tmp_path / "resume.txt"
+    source_path.write_bytes(RESUME_TEXT)
+
+    result = _sanitize_and_move(source_path, upload_dir / "file-id_resume.txt")
+
+    assert result["success"], result["error"]
+    assert (real_upload_dir / "file-id_resume.txt").read_bytes() == RESUME_TEXT
+
+
+def test_validated_secure_path_moves_inside_upload_dir(tmp_path, upload_dir):
+    """Test that the secure path chosen by validation is accepted by the move."""
+
+    resume_path = tmp_path / "resume.txt"
+    resume_path.write_bytes(RESUME_TEXT)
+
+    validation = _validate(resume_path, client_name="o'brien..jr")
+    result = _sanitize_and_move(resume_path, validation["secure_path"])
+
+    assert validation["valid"], validation["error"]
+    assert result["success"], result["error"]
+    assert Path(result["secure_path"]).parent == upload_dir
@@ -0,0 +1,36 @@
+"""
+Unit tests for the servers' shared UTC timestamp helpers
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from mcp_servers import timestamps
+
+
+def test_timestamps_are_utc_and_agree():
+    """Test that both forms carry the same UTC second."""
+
+    before = datetime.now(timezone.utc).replace(microsecond=0)
+    iso = datetime.fromisoformat(timestamps.now_iso())
+    compact = datetime.strptime(timestamps.now_compact(), "%Y%m%d_%H%M%S").replace(tzinfo=timezone.utc)
+    after = datetime.now(timezone.utc)
+
+    assert iso.utcoffset() == timedelta(0)
+    assert before <= iso <= after
+    assert before <= compact <= after
+    assert abs(iso - compact) <= timedelta(seconds=1)
+
+
+def test_timestamps_reformat_when_the_second_changes(monkeypatch):
+    """Test that the cached strings follow the clock from one second to the next."""
+
+    clock = [1700000000.25]
+    monkeypatch.setattr(timestamps.time, "time", lambda: clock[0])
+    monkeypatch.setattr(timestamps, "_timestamp_cache", [0, "", ""])
+
+    assert timestamps.now_iso() == "2023-11-14T22:13:20+00:00"
+    clock[0] += 0.5
+    assert timestamps.now_iso() == "2023-11-14T22:13:20+00:00"
+    clock[0] += 0.5
+    assert timestamps.now_iso() == "2023-11-14T22:13:21+00:00"
+    assert timestamps.now_compact() == "20231114_221321"
@@ -5,6 +5,7 @@ Orchestrates the complete resume automation workflow using MCP servers
 
 import os
 import uuid
+import asyncio
 import logging
 from typing import TypedDict, List, Dict, Any, Optional
 from datetime import datetime
@@ -66,6 +67,7 @@ class ResumeProcessingWorkflow:
     
     def __init__(self):
         self.mcp_client = None
+        self._mcp_client_lock = asyncio.Lock()
         self.workflow = None
         self._setup_mcp_servers()
         self._build_workflow()
@@ -94,11 +96,17 @@ class ResumeProcessingWorkflow:
         logger.info("MCP server configuration initialized")
     
     async def _initialize_mcp_client(self):
-        """Initialize the MCP client if not already done."""
-        if not self.mcp_client:
-            self.mcp_client = MultiServerMCPClient(self.mcp_config)
-            await self.mcp_client.__aenter__()
-            logger.info("MCP client initialized successfully")
+        """Initialize the MCP client once; concurrent callers share the same instance."""
+        if self.mcp_client:
+            return
+        
+        async with self._mcp_client_lock:
+            # Another caller may have finished initializing while we waited
+            if not self.mcp_client:
+                mcp_client = MultiServerMCPClient(self.mcp_config)
+                await mcp_client.__aenter__()
+                self.mcp_client = mcp_client
+                logger.info("MCP client initialized successfully")
     
     def _build_workflow(self):
         """Build the LangGraph workflow."""